@@ -0,0 +1,197 @@
+from filters.PositionCorrection import VELOCITY_NOISE, STEERING_NOISE, POSITION_NOISE, DEFAULT_Q, DEFAULT_Q_CORR
+from models.BicycleFleet import BicycleFleet
+
+import numpy as np
+
+class BatchedExtendedKalmanFilter:
+    def __init__(self, num_filters, x0, P0=None, Q=None, Q_corr=None, wheelbase=2.5) -> None:
+        """K independent EKFs of the bicycle model (same equations as ExtendedKalmanFilter), stored as stacked arrays
+
+        Args:
+            num_filters (int): The number of filters K
+            x0 (array like): (3,) or (K, 3) initial states [x, y, theta]
+            P0 (array like, optional): (3, 3) or (K, 3, 3) initial covariances. Defaults to zeros.
+            Q (array like, optional): (2, 2) or (K, 2, 2) covariance of the (velocity, steering) noise
+            Q_corr (array like, optional): (2, 2) or (K, 2, 2) covariance of the position measurement noise
+            wheelbase (float or array like, optional): The wheelbase, shared or one per filter
+        """
+        self.num_filters = num_filters
+
+        self.x = np.empty((num_filters, 3))
+        self.x[:] = x0
+        self.P = np.zeros((num_filters, 3, 3))
+        if P0 is not None:
+            self.P[:] = P0
+
+        self.Q = np.empty((num_filters, 2, 2))
+        self.Q[:] = Q if Q is not None else DEFAULT_Q
+        self.Q_corr = np.empty((num_filters, 2, 2))
+        self.Q_corr[:] = Q_corr if Q_corr is not None else DEFAULT_Q_CORR
+
+        self.wheelbase = np.empty(num_filters)
+        self.wheelbase[:] = wheelbase
+
+        # Jacobians, only the non constant terms are rewritten at each step
+        self.F = np.zeros((num_filters, 3, 3))
+        self.F[:, [0, 1, 2], [0, 1, 2]] = 1
+        self.G = np.zeros((num_filters, 3, 2))
+
+        self.state_dot = np.empty((num_filters, 3))
+
+        # Last correction, kept for the consistency checks
+        self.innovation = np.zeros((num_filters, 2))
+        self.S = np.zeros((num_filters, 2, 2))
+        self.S_inv = np.zeros((num_filters, 2, 2))
+
+
+    def predict(self, dt, velocity, steering_angle):
+        """Prediction step of all the filters
+
+        Args:
+            dt (float): The step size (s)
+            velocity (float or np.ndarray): (K,) measured velocities
+            steering_angle (float or np.ndarray): (K,) measured steering angles
+        """
+        cos_theta = np.cos(self.x[:, 2])
+        sin_theta = np.sin(self.x[:, 2])
+
+        self.F[:, 0, 2] = -dt * velocity * sin_theta
+        self.F[:, 1, 2] = dt * velocity * cos_theta
+
+        self.G[:, 0, 0] = dt * cos_theta
+        self.G[:, 1, 0] = dt * sin_theta
+        self.G[:, 2, 1] = dt * velocity / (self.wheelbase * np.cos(steering_angle) ** 2)
+
+        BicycleFleet.derivatives(self.x, steering_angle, velocity, self.wheelbase, out=self.state_dot)
+        self.x += dt * self.state_dot
+
+        # P = F P F^T + G Q G^T, written with the sparsity of F and G (batched 3x3 matmuls are slower)
+        a = self.F[:, 0, 2, None]
+        b = self.F[:, 1, 2, None]
+        P = self.P
+        P[:, 0, :] += a * P[:, 2, :]
+        P[:, 1, :] += b * P[:, 2, :]
+        P[:, :, 0] += a * P[:, :, 2]
+        P[:, :, 1] += b * P[:, :, 2]
+
+        g0 = self.G[:, 0, 0]
+        g1 = self.G[:, 1, 0]
+        g2 = self.G[:, 2, 1]
+        q00 = self.Q[:, 0, 0]
+        q01 = self.Q[:, 0, 1]
+        q11 = self.Q[:, 1, 1]
+        P[:, 0, 0] += q00 * g0 * g0
+        P[:, 1, 1] += q00 * g1 * g1
+        P[:, 2, 2] += q11 * g2 * g2
+        P[:, 0, 1] += q00 * g0 * g1
+        P[:, 1, 0] += q00 * g0 * g1
+        P[:, 0, 2] += q01 * g0 * g2
+        P[:, 2, 0] += q01 * g0 * g2
+        P[:, 1, 2] += q01 * g1 * g2
+        P[:, 2, 1] += q01 * g1 * g2
+
+
+    def update(self, position):
+        """Position correction of all the filters
+
+        Args:
+            position (np.ndarray): (K, 2) measured positions
+        """
+        # H = [[1, 0, 0], [0, 1, 0]], so H P H^T and P H^T are slices of P
+        self.innovation = position - self.x[:, 0:2]
+        self.S = self.P[:, 0:2, 0:2] + self.Q_corr
+
+        # Closed form inverse of the 2x2 innovation covariances
+        S_inv = self.S_inv
+        det = self.S[:, 0, 0] * self.S[:, 1, 1] - self.S[:, 0, 1] * self.S[:, 1, 0]
+        S_inv[:, 0, 0] = self.S[:, 1, 1] / det
+        S_inv[:, 1, 1] = self.S[:, 0, 0] / det
+        S_inv[:, 0, 1] = -self.S[:, 0, 1] / det
+        S_inv[:, 1, 0] = -self.S[:, 1, 0] / det
+
+        # K = P H^T S^-1, (K, 3, 2)
+        PHt = self.P[:, :, 0:2]
+        K = PHt[:, :, 0, None] * S_inv[:, None, 0, :] + PHt[:, :, 1, None] * S_inv[:, None, 1, :]
+
+        self.x += K[:, :, 0] * self.innovation[:, 0, None] + K[:, :, 1] * self.innovation[:, 1, None]
+        # P = (I - K H) P = P - K (H P)
+        self.P -= K[:, :, 0, None] * self.P[:, None, 0, :] + K[:, :, 1, None] * self.P[:, None, 1, :]
+
+
+    def nis(self):
+        """Normalized innovation squared of the last correction, (K,)
+        """
+        return np.einsum('ki,kij,kj->k', self.innovation, self.S_inv, self.innovation)
+
+
+    def nees(self, x_true):
+        """Normalized estimation error squared, (K,)
+
+        Args:
+            x_true (array like): (3,) or (K, 3) true states
+        """
+        error = x_true - self.x
+        error[:, 2] = (error[:, 2] + np.pi) % (2 * np.pi) - np.pi
+        return np.einsum('ki,ki->k', error, np.linalg.solve(self.P, error[..., None])[..., 0])
+
+
+def runMonteCarlo(inputs, num_runs, x0, wheelbase=2.5, Q=None, Q_corr=None, P0=None, seed=None):
+    """Runs num_runs filters over the same (noiseless) trajectory, each with its own noise draws
+
+    Args:
+        inputs (array like): (N, 3) rows of [dt, steering_rad, velocity]
+        num_runs (int): The number of Monte-Carlo runs K
+        x0 (array like): (3,) initial state of the vehicle
+        wheelbase (float, optional): The vehicle's wheelbase
+        Q, Q_corr, P0: see BatchedExtendedKalmanFilter
+        seed (int, optional): Seed of the noise generator
+
+    Returns:
+        dict: "truth" (N, 3), "nees" (N, K) and "nis" (N, K)
+    """
+    inputs = np.asarray(inputs, dtype=float).reshape(-1, 3)
+    rng = np.random.default_rng(seed)
+
+    # P0 = 0 makes the first NEES singular, start from a small covariance instead
+    if P0 is None:
+        P0 = np.diag([1e-3, 1e-3, 1e-4])
+    ekf = BatchedExtendedKalmanFilter(num_runs, x0, P0, Q, Q_corr, wheelbase)
+
+    truth = np.array(x0, dtype=float).reshape(1, 3)
+    truth_dot = np.empty((1, 3))
+    record = {
+        "truth": np.empty((len(inputs), 3)),
+        "nees": np.empty((len(inputs), num_runs)),
+        "nis": np.empty((len(inputs), num_runs)),
+    }
+
+    for i, (dt, steering_rad, velocity) in enumerate(inputs.tolist()):
+        BicycleFleet.derivatives(truth, steering_rad, velocity, wheelbase, out=truth_dot)
+        truth += dt * truth_dot
+
+        # Same noise models as BicycleModel.getNoisy*
+        noisy_velocity = velocity * (1 + rng.normal(0, VELOCITY_NOISE, num_runs))
+        noisy_steering = steering_rad + rng.normal(0, STEERING_NOISE, num_runs)
+        noisy_position = truth[:, 0:2] + rng.normal(0, POSITION_NOISE, (num_runs, 2))
+
+        ekf.predict(dt, noisy_velocity, noisy_steering)
+        ekf.update(noisy_position)
+
+        record["truth"][i] = truth[0]
+        record["nis"][i] = ekf.nis()
+        record["nees"][i] = ekf.nees(truth)
+
+    return record
+
+
+if __name__ == "__main__":
+    import time
+
+    dt = 1 / 120
+    t = np.arange(0, 20, dt)
+    inputs = np.column_stack([np.full_like(t, dt), np.radians(20) * np.sin(t / 5), np.full_like(t, 5)])
+
+    start = time.perf_counter()
+    record = runMonteCarlo(inputs, 10000, [2, 1, 0], seed=0)
+    print(f"{len(inputs)} steps x 10000 runs in {time.perf_counter() - start:.2f} s")
+    print(f"Average NEES: {record['nees'].mean():.2f} (expected 3), average NIS: {record['nis'].mean():.2f} (expected 2)")
@@ -0,0 +1,131 @@
+from filters.PositionCorrection import PositionCorrection, DEFAULT_Q, DEFAULT_Q_CORR
+
+import math
+import numpy as np
+
+class ExtendedKalmanFilter:
+    def __init__(self, x0, wheelbase: float, Q=None, Q_corr=None, P0=None, joseph_form=False) -> None:
+        """EKF of the bicycle model, estimating [x, y, theta] from the (velocity, steering) odometry and position measurements.
+        The state, covariance, Jacobians and intermediates are preallocated and updated in place.
+
+        Args:
+            x0 (array like): The initial state [x, y, theta]
+            wheelbase (float): The distance between the front and back wheels
+            Q (np.ndarray, optional): (2, 2) covariance of the (velocity, steering) noise
+            Q_corr (np.ndarray, optional): (2, 2) covariance of the position measurement noise
+            P0 (np.ndarray, optional): (3, 3) initial covariance. Defaults to zeros.
+            joseph_form (bool, optional): Use the Joseph form covariance correction. Defaults to False.
+        """
+        self.wheelbase = wheelbase
+
+        self.x = np.array(x0, dtype=float)
+        self.P = np.zeros((3, 3))
+        if P0 is not None:
+            self.P[:] = P0
+
+        self.Q = np.array(Q if Q is not None else DEFAULT_Q, dtype=float)
+        self.Q_corr = np.array(Q_corr if Q_corr is not None else DEFAULT_Q_CORR, dtype=float)
+
+        # Jacobians, only the non constant terms are rewritten at each step
+        self.F = np.eye(3)
+        self.G = np.zeros((3, 2))
+
+        # Buffers
+        self.FP = np.zeros((3, 3))
+        self.GQ = np.zeros((3, 2))
+        self.GQGt = np.zeros((3, 3))
+
+        self.position_correction = PositionCorrection(self.Q_corr, joseph_form)
+
+    @property
+    def state(self):
+        return self.x
+
+    @property
+    def covariance(self):
+        return self.P
+
+    @property
+    def nis(self):
+        """Normalized innovation squared of the last correction
+        """
+        return self.position_correction.nis
+
+
+    def getSnapshot(self):
+        """Returns a copy of everything needed to restore the filter to its current state
+        """
+        return self.x.copy(), self.P.copy()
+
+    def setSnapshot(self, snapshot):
+        x, P = snapshot
+        self.x[:] = x
+        self.P[:] = P
+
+
+    def predict(self, dt, velocity, steering_angle):
+        """Prediction step
+
+        Model
+        input: velocity and steering_angle
+        state: x, y, theta
+        x_dot = velocity * cos(theta)
+        y_dot = velocity * sin(theta)
+        theta_dot = velocity * tan(steering_angle) / wheelbase
+
+        so
+        x_k+1 = x_k + dt * (velocity + n_v) * cos(theta)
+        y_k+1 = y_k + dt * (velocity + n_v) * sin(theta)
+        theta_k+1 = theta_k + dt * velocity * tan(steering_angle + n_a) / wheelbase
+
+        F = derivative of f wrt to X
+        F = [
+          [1, 0, -dt * velocity * sin(theta)],
+          [0, 1, dt * velocity * cos(theta)],
+          [0, 0, 1]
+        ]
+
+        G = derivative of f wrt to N
+        G = [
+          [dt * cos(theta), 0],
+          [dt * sin(theta), 0],
+          [0, dt * velocity / (wheelbase * cos(steering_angle + n_a) ** 2)]
+        ]
+
+        Args:
+            dt (float): The step size (s)
+            velocity (float): The measured velocity (m/s)
+            steering_angle (float): The measured steering angle (rad)
+        """
+        x = self.x
+        cos_theta = math.cos(x[2])
+        sin_theta = math.sin(x[2])
+
+        F = self.F
+        F[0, 2] = -dt * velocity * sin_theta
+        F[1, 2] = dt * velocity * cos_theta
+
+        G = self.G
+        G[0, 0] = dt * cos_theta
+        G[1, 0] = dt * sin_theta
+        G[2, 1] = dt * velocity / (self.wheelbase * math.cos(steering_angle) ** 2)
+
+        x[0] += dt * velocity * cos_theta
+        x[1] += dt * velocity * sin_theta
+        x[2] += dt * velocity * math.tan(steering_angle) / self.wheelbase
+
+        # P = F P F^T + G Q G^T
+        np.matmul(F, self.P, out=self.FP)
+        np.matmul(self.FP, F.T, out=self.P)
+        np.matmul(G, self.Q, out=self.GQ)
+        np.matmul(self.GQ, G.T, out=self.GQGt)
+        self.P += self.GQGt
+
+
+    def update(self, position):
+        """Position correction, h(x) = [x, y]
+
+        Args:
+            position: The measured position (anything indexable by 0 and 1, like Vector2.to_np() or a tuple)
+        """
+        self.position_correction.apply(self.x, self.P, position)
@@ -0,0 +1,133 @@
+from collections import deque
+
+class FusionScheduler:
+    def __init__(self, estimator, start_time=0, history_length=100) -> None:
+        """Feeds an estimator with timestamped odometry and position measurements arriving at their own rates.
+        Predictions happen when odometry arrives, corrections only when a measurement arrives,
+        after predicting up to the measurement time with the held odometry inputs.
+        Out of sequence measurements are handled by rolling back to the odometry tick preceding them,
+        predicting up to them, applying them, and replaying the following ticks from a short history.
+
+        The estimator must provide predict(dt, velocity, steering), update(position), getSnapshot() and setSnapshot(snapshot).
+
+        Args:
+            estimator: The filter to schedule (ExtendedKalmanFilter for instance)
+            start_time (float, optional): The timestamp of the estimator's initial state. Defaults to 0.
+            history_length (int, optional): The number of odometry ticks kept for out of sequence measurements. Defaults to 100.
+        """
+        self.estimator = estimator
+        self.time = start_time
+
+        # Zero-order hold of the last odometry inputs
+        self.velocity = 0
+        self.steering = 0
+
+        # Each tick holds the inputs used to reach it, the measurements applied at it, and the state after both
+        self.history = deque([], history_length)
+        self.history.append({
+            "time": start_time,
+            "inputs": None,
+            "measurements": [],
+            "snapshot": estimator.getSnapshot()
+        })
+
+        self.num_predictions = 0
+        self.num_corrections = 0
+        self.num_replays = 0
+        self.dropped_measurements = 0
+
+
+    def addOdometry(self, timestamp, velocity, steering):
+        """Predicts up to timestamp with the previous odometry inputs, then holds the new ones
+
+        Args:
+            timestamp (float): The time the odometry was sampled (s)
+            velocity (float): The measured velocity (m/s)
+            steering (float): The measured steering angle (rad)
+        """
+        if timestamp > self.time:
+            self._predictTo(timestamp)
+
+        self.velocity = velocity
+        self.steering = steering
+
+
+    def addMeasurement(self, timestamp, position):
+        """Corrects the estimator with a position measured at timestamp
+
+        Args:
+            timestamp (float): The time the position was measured (s)
+            position: The measured position, as accepted by the estimator's update
+        """
+        if timestamp >= self.time:
+            # In sequence, applied at a new tick at the measurement time
+            if timestamp > self.time:
+                self._predictTo(timestamp)
+            self._correct(self.history[-1], position)
+            return
+
+        # Out of sequence, find the last tick before the measurement
+        if timestamp < self.history[0]["time"]:
+            self.dropped_measurements += 1
+            return
+
+        k = len(self.history) - 1
+        while self.history[k]["time"] > timestamp:
+            k -= 1
+
+        tick = self.history[k]
+        self.estimator.setSnapshot(tick["snapshot"])
+
+        if timestamp > tick["time"]:
+            # Splits the interval to the next tick at the measurement time
+            next_tick = self.history[k + 1]
+            _, velocity, steering = next_tick["inputs"]
+            inputs = (timestamp - tick["time"], velocity, steering)
+            self.estimator.predict(*inputs)
+            self.num_predictions += 1
+            next_tick["inputs"] = (next_tick["time"] - timestamp, velocity, steering)
+
+            tick = {
+                "time": timestamp,
+                "inputs": inputs,
+                "measurements": [],
+                "snapshot": None # Set by the correction
+            }
+            if len(self.history) == self.history.maxlen:
+                self.history.popleft()
+                k -= 1
+            k += 1
+            self.history.insert(k, tick)
+
+        self._correct(tick, position)
+
+        # Replay the following ticks
+        for i in range(k + 1, len(self.history)):
+            tick = self.history[i]
+            self.estimator.predict(*tick["inputs"])
+            for measurement in tick["measurements"]:
+                self.estimator.update(measurement)
+            tick["snapshot"] = self.estimator.getSnapshot()
+            self.num_replays += 1
+
+
+    def _predictTo(self, timestamp):
+        inputs = (timestamp - self.time, self.velocity, self.steering)
+        self.estimator.predict(*inputs)
+        self.num_predictions += 1
+
+        self.time = timestamp
+        self.history.append({
+            "time": timestamp,
+            "inputs": inputs,
+            "measurements": [],
+            "snapshot": self.estimator.getSnapshot()
+        })
+
+
+    def _correct(self, tick, position):
+        self.estimator.update(position)
+        self.num_corrections += 1
+
+        tick["measurements"].append(position)
+        tick["snapshot"] = self.estimator.getSnapshot()
@@ -0,0 +1,173 @@
+from filters.PositionCorrection import VELOCITY_NOISE, STEERING_NOISE, DEFAULT_Q_CORR
+from models.BicycleFleet import BicycleFleet
+
+import numpy as np
+
+class ParticleFilter:
+    def __init__(self, x0, wheelbase: float, num_particles=10000, P0=None, velocity_noise=VELOCITY_NOISE, steering_noise=STEERING_NOISE, Q_corr=None, resampling_threshold=0.5, roughening=0.2, seed=None) -> None:
+        """Particle filter of the bicycle model, same interface as ExtendedKalmanFilter.
+        The particles are propagated with the same noise model as BicycleModel.getNoisyVelocity/getNoisySteering,
+        and resampled systematically, without any Python loop over the particles.
+
+        Args:
+            x0 (array like): The initial state [x, y, theta]
+            wheelbase (float): The distance between the front and back wheels
+            num_particles (int, optional): The number of particles. Defaults to 10000.
+            P0 (np.ndarray, optional): (3, 3) covariance of the initial particles. Defaults to zeros.
+            velocity_noise (float, optional): Standard deviation of the relative velocity noise
+            steering_noise (float, optional): Standard deviation of the steering noise (rad)
+            Q_corr (np.ndarray, optional): (2, 2) covariance of the position measurement noise
+            resampling_threshold (float, optional): Resample when the effective sample size drops below this ratio of num_particles
+            roughening (float, optional): Tuning constant of the jitter added after resampling, 0 disables it. Defaults to 0.2.
+            seed (int, optional): Seed of the particles' noise generator
+        """
+        self.wheelbase = wheelbase
+        self.num_particles = num_particles
+        self.velocity_noise = velocity_noise
+        self.steering_noise = steering_noise
+        self.resampling_threshold = resampling_threshold
+        self.roughening = roughening
+
+        self.Q_corr = np.array(Q_corr if Q_corr is not None else DEFAULT_Q_CORR, dtype=float)
+        self.Q_corr_inv = np.linalg.inv(self.Q_corr)
+
+        self.rng = np.random.default_rng(seed)
+
+        self.particles = np.empty((num_particles, 3))
+        if P0 is not None:
+            self.particles[:] = self.rng.multivariate_normal(x0, P0, num_particles)
+        else:
+            self.particles[:] = x0
+        self.weights = np.full(num_particles, 1 / num_particles)
+
+        # Buffers
+        self.particles_dot = np.empty((num_particles, 3))
+
+        # Estimate cache, invalidated when the particles or the weights change
+        self._x = None
+        self._P = None
+
+    @property
+    def state(self):
+        if self._x is None:
+            self._computeEstimate()
+        return self._x
+
+    @property
+    def covariance(self):
+        if self._P is None:
+            self._computeEstimate()
+        return self._P
+
+    @property
+    def effective_sample_size(self):
+        return 1 / np.dot(self.weights, self.weights)
+
+
+    def _computeEstimate(self):
+        w = self.weights
+        x = np.empty(3)
+        x[0:2] = w @ self.particles[:, 0:2]
+        # Circular mean of the headings
+        x[2] = np.arctan2(w @ np.sin(self.particles[:, 2]), w @ np.cos(self.particles[:, 2]))
+
+        deviations = self.particles - x
+        deviations[:, 2] = (deviations[:, 2] + np.pi) % (2 * np.pi) - np.pi
+
+        self._x = x
+        self._P = (deviations.T * w) @ deviations
+
+
+    def getSnapshot(self):
+        """Returns a copy of everything needed to restore the filter to its current state
+        """
+        return self.particles.copy(), self.weights.copy()
+
+    def setSnapshot(self, snapshot):
+        particles, weights = snapshot
+        self.particles[:] = particles
+        self.weights[:] = weights
+        self._x = self._P = None
+
+
+    def spreadUniformly(self, x_min, x_max, y_min, y_max):
+        """Spreads the particles uniformly over a rectangle with random headings (kidnapped robot)
+        """
+        n = self.num_particles
+        self.particles[:, 0] = self.rng.uniform(x_min, x_max, n)
+        self.particles[:, 1] = self.rng.uniform(y_min, y_max, n)
+        self.particles[:, 2] = self.rng.uniform(-np.pi, np.pi, n)
+        self.weights[:] = 1 / n
+        self._x = self._P = None
+
+
+    def predict(self, dt, velocity, steering_angle):
+        """Prediction step, each particle draws its own odometry noise
+
+        Args:
+            dt (float): The step size (s)
+            velocity (float): The measured velocity (m/s)
+            steering_angle (float): The measured steering angle (rad)
+        """
+        n = self.num_particles
+        velocities = velocity * (1 + self.rng.normal(0, self.velocity_noise, n))
+        steerings = steering_angle + self.rng.normal(0, self.steering_noise, n)
+
+        BicycleFleet.derivatives(self.particles, steerings, velocities, self.wheelbase, out=self.particles_dot)
+        self.particles += dt * self.particles_dot
+        self._x = self._P = None
+
+
+    def update(self, position):
+        """Position correction, h(x) = [x, y]
+
+        Args:
+            position: The measured position (anything indexable by 0 and 1, like Vector2.to_np() or a tuple)
+        """
+        dx = position[0] - self.particles[:, 0]
+        dy = position[1] - self.particles[:, 1]
+        R_inv = self.Q_corr_inv
+        log_likelihood = -0.5 * (R_inv[0, 0] * dx * dx + (R_inv[0, 1] + R_inv[1, 0]) * dx * dy + R_inv[1, 1] * dy * dy)
+
+        # Weights in log space to avoid underflows when the estimate is far from the measurement
+        with np.errstate(divide='ignore'):
+            log_weights = np.log(self.weights) + log_likelihood
+        log_weights -= log_weights.max()
+        np.exp(log_weights, out=self.weights)
+        self.weights /= self.weights.sum()
+        self._x = self._P = None
+
+        if self.effective_sample_size < self.resampling_threshold * self.num_particles:
+            self.resample()
+
+
+    def resample(self):
+        """Systematic resampling, followed by roughening
+        """
+        n = self.num_particles
+        positions = (self.rng.random() + np.arange(n)) / n
+        cumulative_weights = np.cumsum(self.weights)
+        cumulative_weights[-1] = 1 # Avoids round-off errors
+        indexes = np.searchsorted(cumulative_weights, positions)
+
+        self.particles[:] = self.particles[indexes]
+        self.weights[:] = 1 / n
+        self._x = self._P = None
+
+        if self.roughening > 0:
+            self.roughen()
+
+
+    def roughen(self):
+        """Gaussian jitter on the particles, scaled to the spread of the cloud (Gordon et al. 1993).
+        Resampling duplicates the likely particles, without it the cloud collapses onto a few
+        copies and can't recover from a wrong heading (after a kidnapping for instance)
+        """
+        n = self.num_particles
+        deviations = self.particles - self.state
+        deviations[:, 2] = (deviations[:, 2] + np.pi) % (2 * np.pi) - np.pi
+        # Standard deviation proportional to the extent of the cloud in each dimension, K * E * N^(-1/d)
+        sigma = self.roughening * (deviations.max(axis=0) - deviations.min(axis=0)) * n ** (-1 / 3)
+
+        self.particles += self.rng.normal(0, 1, (n, 3)) * sigma
+        self._x = self._P = None
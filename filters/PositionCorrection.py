@@ -0,0 +1,86 @@
+import numpy as np
+
+# Standard deviations of the simulated sensors noise (3 sigma: 10 % of the velocity, 9 deg of steering, 0.40 m of position)
+VELOCITY_NOISE  = 0.10 / 3          # Relative to the velocity
+STEERING_NOISE  = (np.pi / 20) / 3  # rad
+POSITION_NOISE  = 0.40 / 3          # m
+
+# Default covariances of the filters, matching the noise above
+DEFAULT_Q       = np.diag([VELOCITY_NOISE, STEERING_NOISE]) ** 2
+DEFAULT_Q_CORR  = np.diag([POSITION_NOISE, POSITION_NOISE]) ** 2
+
+class PositionCorrection:
+    def __init__(self, Q_corr, joseph_form=False) -> None:
+        """Kalman correction for a direct position measurement h(x) = [x, y] of a 3 states [x, y, theta] filter.
+        The 2x2 innovation covariance is inverted in closed form and every intermediate lives in a preallocated buffer.
+
+        Args:
+            Q_corr (np.ndarray): (2, 2) covariance of the position measurement noise
+            joseph_form (bool, optional): Use the Joseph form P = (I - KH) P (I - KH)^T + K R K^T, which keeps P
+                symmetric positive definite despite rounding errors, at the cost of a few more products. Defaults to False.
+        """
+        self.Q_corr = np.array(Q_corr, dtype=float)
+        self.joseph_form = joseph_form
+
+        # Buffers
+        self.innovation = np.zeros(2)
+        self.S = np.zeros((2, 2))
+        self.S_inv = np.zeros((2, 2))
+        self.K = np.zeros((3, 2))
+        self.dx = np.zeros(3)
+        self.I_KH = np.eye(3)
+        self.KR = np.zeros((3, 2))
+        self.tmp_3x3 = np.zeros((3, 3))
+        self.tmp_3x3_bis = np.zeros((3, 3))
+        self.nis = 0
+
+
+    def apply(self, x, P, position):
+        """Corrects the state and covariance in place
+
+        Args:
+            x (np.ndarray): (3,) the state [x, y, theta], modified in place
+            P (np.ndarray): (3, 3) the covariance, modified in place
+            position: The measured position (anything indexable by 0 and 1, like Vector2.to_np() or a tuple)
+        """
+        # H = [[1, 0, 0], [0, 1, 0]] so H P H^T = P[:2, :2] and P H^T = P[:, :2]
+        innovation = self.innovation
+        i0 = innovation[0] = position[0] - x[0]
+        i1 = innovation[1] = position[1] - x[1]
+
+        S = self.S
+        np.add(P[0:2, 0:2], self.Q_corr, out=S)
+
+        # Closed form inverse of S
+        s00, s01, s10, s11 = S[0, 0], S[0, 1], S[1, 0], S[1, 1]
+        det = s00 * s11 - s01 * s10
+        S_inv = self.S_inv
+        S_inv[0, 0] = s11 / det
+        S_inv[0, 1] = -s01 / det
+        S_inv[1, 0] = -s10 / det
+        S_inv[1, 1] = s00 / det
+
+        K = self.K
+        np.matmul(P[:, 0:2], S_inv, out=K)
+
+        # x = x + K innovation
+        np.matmul(K, innovation, out=self.dx)
+        x += self.dx
+
+        if self.joseph_form:
+            # P = (I - KH) P (I - KH)^T + K R K^T
+            I_KH = self.I_KH
+            I_KH[:, 0:2] = -K
+            I_KH[0, 0] += 1
+            I_KH[1, 1] += 1
+            np.matmul(I_KH, P, out=self.tmp_3x3)
+            np.matmul(self.tmp_3x3, I_KH.T, out=P)
+            np.matmul(K, self.Q_corr, out=self.KR)
+            np.matmul(self.KR, K.T, out=self.tmp_3x3_bis)
+            P += self.tmp_3x3_bis
+        else:
+            # P = (I - KH) P = P - K (H P)
+            np.matmul(K, P[0:2, :], out=self.tmp_3x3)
+            P -= self.tmp_3x3
+
+        self.nis = (i0 * (s11 * i0 - s01 * i1) + i1 * (s00 * i1 - s10 * i0)) / det
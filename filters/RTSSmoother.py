@@ -0,0 +1,204 @@
+import os
+import numpy as np
+
+# Covariances are symmetric, only their upper triangle is stored
+_TRIU = np.triu_indices(3)
+
+def pack_covariances(P):
+    """(..., 3, 3) symmetric matrices to their (..., 6) upper triangles
+    """
+    return P[..., _TRIU[0], _TRIU[1]]
+
+def unpack_covariances(packed):
+    """(..., 6) upper triangles to (..., 3, 3) symmetric matrices
+    """
+    P = np.empty(packed.shape[:-1] + (3, 3))
+    P[..., _TRIU[0], _TRIU[1]] = packed
+    P[..., _TRIU[1], _TRIU[0]] = packed
+    return P
+
+
+class EKFRecorder:
+    FIELDS = {
+        "x_pred": (3,),
+        "P_pred": (6,),
+        "F": (3, 3),
+        "x_post": (3,),
+        "P_post": (6,),
+    }
+
+    def __init__(self, directory=None, chunk_size=10000) -> None:
+        """Records the predictions, posteriors and Jacobians of an EKF run, chunk by chunk.
+        Full chunks are written to directory (as chunk_XXXXXX.npz files) so that runs of any length fit in memory,
+        or kept in memory if no directory is given.
+
+        Use recordPosterior(ekf) once for the initial state, then recordPrediction(ekf) after each predict
+        and recordPosterior(ekf) after the corrections of that step (if any).
+
+        Args:
+            directory (str, optional): Where to write the chunks. Defaults to None (in memory).
+            chunk_size (int, optional): The number of steps per chunk. Defaults to 10000.
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        self.chunks = [] # Paths of the written chunks, or the chunks themselves if in memory
+        self.chunk_lengths = []
+        self._newBuffer()
+        self.prediction_pending = False
+
+
+    def _newBuffer(self):
+        self.buffer = {name: np.empty((self.chunk_size,) + shape) for name, shape in self.FIELDS.items()}
+        self.buffer_length = 0
+
+
+    @property
+    def num_steps(self):
+        return sum(self.chunk_lengths) + self.buffer_length
+
+
+    def recordPrediction(self, ekf):
+        i = self.buffer_length
+        self.buffer["x_pred"][i] = ekf.state
+        self.buffer["P_pred"][i] = pack_covariances(ekf.covariance)
+        self.buffer["F"][i] = ekf.F
+        self.prediction_pending = True
+
+
+    def recordPosterior(self, ekf):
+        i = self.buffer_length
+        if not self.prediction_pending:
+            # Initial state (or a step without prediction), it is its own prediction
+            self.buffer["x_pred"][i] = ekf.state
+            self.buffer["P_pred"][i] = pack_covariances(ekf.covariance)
+            self.buffer["F"][i] = np.eye(3)
+        self.buffer["x_post"][i] = ekf.state
+        self.buffer["P_post"][i] = pack_covariances(ekf.covariance)
+
+        self.prediction_pending = False
+        self.buffer_length += 1
+        if self.buffer_length == self.chunk_size:
+            self.flush()
+
+
+    def flush(self):
+        """Stores the current (possibly partial) chunk
+        """
+        if self.buffer_length == 0:
+            return
+
+        chunk = {name: values[:self.buffer_length] for name, values in self.buffer.items()}
+        if self.directory is not None:
+            path = os.path.join(self.directory, f"chunk_{len(self.chunks):06d}.npz")
+            np.savez(path, **chunk)
+            self.chunks.append(path)
+        else:
+            self.chunks.append(chunk)
+        self._newBuffer()
+        self.chunk_lengths.append(len(chunk["x_post"]))
+
+
+    def loadChunk(self, i):
+        chunk = self.chunks[i]
+        if self.directory is not None:
+            with np.load(chunk) as data:
+                return {name: data[name] for name in self.FIELDS}
+        return chunk
+
+
+class RTSSmoother:
+    def __init__(self, recorder: EKFRecorder) -> None:
+        """Fixed interval Rauch-Tung-Striebel smoother over a recorded EKF run.
+        The chunks are processed from the last to the first, with the smoother gains of a whole chunk
+        computed in one batch, so only one chunk is in memory at a time.
+
+        Args:
+            recorder (EKFRecorder): The recorded run
+        """
+        self.recorder = recorder
+
+
+    def run(self):
+        """Generator yielding the smoothed run chunk by chunk, from the last chunk to the first
+
+        Yields:
+            (int, np.ndarray, np.ndarray): The index of the chunk's first step, the (n, 3) smoothed states and the (n, 3, 3) smoothed covariances
+        """
+        self.recorder.flush()
+
+        start = self.recorder.num_steps
+        next_x_smooth = next_P_smooth = None
+        next_x_pred = next_P_pred = next_F = None
+
+        for i in reversed(range(len(self.recorder.chunks))):
+            chunk = self.recorder.loadChunk(i)
+            n = len(chunk["x_post"])
+            start -= n
+
+            x_post = chunk["x_post"]
+            P_post = unpack_covariances(chunk["P_post"])
+
+            # Quantities of step k + 1 for each step k of the chunk
+            x_pred_next = np.empty((n, 3))
+            P_pred_next = np.empty((n, 3, 3))
+            F_next = np.empty((n, 3, 3))
+            x_pred_next[:-1] = chunk["x_pred"][1:]
+            P_pred_next[:-1] = unpack_covariances(chunk["P_pred"][1:])
+            F_next[:-1] = chunk["F"][1:]
+            if next_x_pred is not None:
+                x_pred_next[-1] = next_x_pred
+                P_pred_next[-1] = next_P_pred
+                F_next[-1] = next_F
+            else:
+                # Last step of the run, its gain is never used
+                x_pred_next[-1] = 0
+                P_pred_next[-1] = np.eye(3)
+                F_next[-1] = np.eye(3)
+
+            # Smoother gains C_k = P_post_k F_k+1^T P_pred_k+1^-1, in one batch: C_k^T = P_pred_k+1^-1 F_k+1 P_post_k
+            FP = np.matmul(F_next, P_post)
+            try:
+                C = np.linalg.solve(P_pred_next, FP).swapaxes(1, 2)
+            except np.linalg.LinAlgError:
+                # Singular predictions (zero initial covariance for instance)
+                C = np.matmul(np.linalg.pinv(P_pred_next, hermitian=True), FP).swapaxes(1, 2)
+
+            # Backward recursion
+            x_smooth = np.empty((n, 3))
+            P_smooth = np.empty((n, 3, 3))
+            if next_x_smooth is None:
+                # Last step of the run, the smoothed estimate is the posterior
+                x_smooth[-1] = x_post[-1]
+                P_smooth[-1] = P_post[-1]
+                x_smooth_k, P_smooth_k = x_smooth[-1], P_smooth[-1]
+                last = n - 2
+            else:
+                x_smooth_k, P_smooth_k = next_x_smooth, next_P_smooth
+                last = n - 1
+
+            for k in range(last, -1, -1):
+                C_k = C[k]
+                x_smooth_k = x_post[k] + C_k @ (x_smooth_k - x_pred_next[k])
+                P_smooth_k = P_post[k] + C_k @ (P_smooth_k - P_pred_next[k]) @ C_k.T
+                x_smooth[k] = x_smooth_k
+                P_smooth[k] = P_smooth_k
+
+            next_x_smooth, next_P_smooth = x_smooth[0], P_smooth[0]
+            next_x_pred = chunk["x_pred"][0]
+            next_P_pred = unpack_covariances(chunk["P_pred"][0])
+            next_F = chunk["F"][0]
+
+            yield start, x_smooth, P_smooth
+
+
+    def smoothAll(self):
+        """Smooths the whole run at once (only for runs that fit in memory)
+
+        Returns:
+            (np.ndarray, np.ndarray): The (N, 3) smoothed states and (N, 3, 3) smoothed covariances
+        """
+        chunks = list(self.run())[::-1]
+        return np.concatenate([chunk[1] for chunk in chunks]), np.concatenate([chunk[2] for chunk in chunks])
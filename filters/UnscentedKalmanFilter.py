@@ -0,0 +1,127 @@
+from filters.PositionCorrection import PositionCorrection, DEFAULT_Q, DEFAULT_Q_CORR
+from models.BicycleFleet import BicycleFleet
+
+import numpy as np
+
+class UnscentedKalmanFilter:
+    def __init__(self, x0, wheelbase: float, Q=None, Q_corr=None, P0=None, joseph_form=False, alpha=0.5, beta=2, kappa=0) -> None:
+        """UKF of the bicycle model, same interface as ExtendedKalmanFilter.
+        The (velocity, steering) noise is part of the augmented state, so the tan(steering) non linearity is
+        sampled instead of linearized. All the sigma points are propagated through the kinematics in one batch.
+        The position measurement is linear, so the correction is the regular Kalman one.
+
+        Args:
+            x0 (array like): The initial state [x, y, theta]
+            wheelbase (float): The distance between the front and back wheels
+            Q (np.ndarray, optional): (2, 2) covariance of the (velocity, steering) noise
+            Q_corr (np.ndarray, optional): (2, 2) covariance of the position measurement noise
+            P0 (np.ndarray, optional): (3, 3) initial covariance. Defaults to zeros.
+            joseph_form (bool, optional): Use the Joseph form covariance correction. Defaults to False.
+            alpha, beta, kappa (float, optional): The scaled sigma points parameters
+        """
+        self.wheelbase = wheelbase
+
+        self.x = np.array(x0, dtype=float)
+        self.P = np.zeros((3, 3))
+        if P0 is not None:
+            self.P[:] = P0
+
+        self.Q = np.array(Q if Q is not None else DEFAULT_Q, dtype=float)
+        self.Q_corr = np.array(Q_corr if Q_corr is not None else DEFAULT_Q_CORR, dtype=float)
+        self.sqrt_Q = np.linalg.cholesky(self.Q)
+
+        # Sigma points of the augmented state [x, y, theta, n_v, n_a]
+        n = 5
+        self.num_sigma_points = 2 * n + 1
+        lambda_ = alpha ** 2 * (n + kappa) - n
+        self.gamma = np.sqrt(n + lambda_)
+
+        self.weights_mean = np.full(self.num_sigma_points, 1 / (2 * (n + lambda_)))
+        self.weights_cov = self.weights_mean.copy()
+        self.weights_mean[0] = lambda_ / (n + lambda_)
+        self.weights_cov[0] = lambda_ / (n + lambda_) + (1 - alpha ** 2 + beta)
+
+        # Buffers
+        self.sqrt_P_a = np.zeros((n, n))
+        self.sqrt_P_a[3:, 3:] = self.sqrt_Q
+        self.sigma_points = np.zeros((self.num_sigma_points, n))
+        self.sigma_states_dot = np.zeros((self.num_sigma_points, 3))
+
+        self.position_correction = PositionCorrection(self.Q_corr, joseph_form)
+
+    @property
+    def state(self):
+        return self.x
+
+    @property
+    def covariance(self):
+        return self.P
+
+    @property
+    def nis(self):
+        """Normalized innovation squared of the last correction
+        """
+        return self.position_correction.nis
+
+
+    def getSnapshot(self):
+        """Returns a copy of everything needed to restore the filter to its current state
+        """
+        return self.x.copy(), self.P.copy()
+
+    def setSnapshot(self, snapshot):
+        x, P = snapshot
+        self.x[:] = x
+        self.P[:] = P
+
+
+    def _sqrtP(self):
+        try:
+            return np.linalg.cholesky(self.P)
+        except np.linalg.LinAlgError:
+            # P is only semi definite (at start up for instance)
+            eigen_val, eigen_vec = np.linalg.eigh(self.P)
+            return eigen_vec * np.sqrt(np.clip(eigen_val, 0, None))
+
+
+    def predict(self, dt, velocity, steering_angle):
+        """Prediction step
+
+        Args:
+            dt (float): The step size (s)
+            velocity (float): The measured velocity (m/s)
+            steering_angle (float): The measured steering angle (rad)
+        """
+        # Sigma points around [x, 0, 0]
+        self.sqrt_P_a[0:3, 0:3] = self._sqrtP()
+        spread = self.gamma * self.sqrt_P_a.T
+        sigma_points = self.sigma_points
+        sigma_points[:, 0:3] = self.x
+        sigma_points[:, 3:] = 0
+        sigma_points[1:6] += spread
+        sigma_points[6:] -= spread
+
+        # Propagate all of them through the kinematics at once
+        states = sigma_points[:, 0:3]
+        BicycleFleet.derivatives(
+            states,
+            steering_angle + sigma_points[:, 4],
+            velocity + sigma_points[:, 3],
+            self.wheelbase,
+            out=self.sigma_states_dot
+        )
+        states += dt * self.sigma_states_dot
+
+        # Recombine
+        self.x[:] = self.weights_mean @ states
+        deviations = states - self.x
+        self.P[:] = (deviations.T * self.weights_cov) @ deviations
+
+
+    def update(self, position):
+        """Position correction, h(x) = [x, y]
+
+        Args:
+            position: The measured position (anything indexable by 0 and 1, like Vector2.to_np() or a tuple)
+        """
+        self.position_correction.apply(self.x, self.P, position)
@@ -1,10 +1,10 @@
 import pygame
 from pygame.locals import *
 
-import time
 
 from lib.Options import Options
 from lib.Events import Events
+from lib.FramePacer import FramePacer
 
 RED = (255,0,0)
 GREEN = (0,255,0)
@@ -23,6 +23,23 @@ class BaseScene:
         self.last_frame_dt = 0
         self.instant_fps = float('inf')
 
+        # Fraction of a physics step elapsed since the last one, used to interpolate the drawing
+        self.physics_alpha = 1
+
+        self.frame_pacer = None
+
+        # Drawing decimation, physics and updates keep running on the frames that are not drawn
+        self.draw_divisor   = getattr(options, "draw_divisor", 1)
+        self.max_draw_fps   = getattr(options, "max_draw_fps", None)
+        self.frame_count    = 0
+        self.draw_elapsed   = 0
+
+        # Dirty rectangles rendering, only the regions drawn this frame or the previous one are cleared and updated
+        self.dirty_rendering        = getattr(options, "dirty_rects", False)
+        self.dirty_rects            = []
+        self.previous_dirty_rects   = []
+        self.full_redraw            = True
+
         self.events         = Events(self,  options.keys)
         self.return_value   = None
 
@@ -32,6 +49,10 @@ class BaseScene:
     def run(self):
         if not self.loaded:
             self.load()
+        self.full_redraw = True
+
+        if getattr(self.options, "physics_rate", None):
+            return self.run_fixed_timestep()
 
         self.continuer      = True
         frame_length        = 1/self.options.fps_target
@@ -40,29 +61,26 @@ class BaseScene:
         last_physics_dt     = 0
         last_frame_dt       = 0
 
+        self.frame_pacer    = FramePacer(physicsframe_length, getattr(self.options, "pacing_spin_ms", 2) / 1000)
+        self.frame_pacer.start()
+
         while self.continuer:
             try:
                 frame_dt = 0
                 for i in range(self.options.physics_frame):
-                    start_physics_frame = time.time()
                     self._physics_update(last_physics_dt)
                     # Update last variables
                     
                     if i == self.options.physics_frame - 1:
                         self._update(last_frame_dt)
-                        self._draw()
+                        if self._should_draw(last_frame_dt, frame_length):
+                            self._draw()
 
                         if pygame.event.peek(QUIT, False):
                             self.continuer = False
                         # pygame.event.pump()
 
-                    
-                    now = time.time()
-                    if now - start_physics_frame <= physicsframe_length:
-                        time.sleep(physicsframe_length + start_physics_frame - now)
-                    
-                    re_now = time.time()
-                    last_physics_dt = re_now - start_physics_frame
+                    last_physics_dt = self.frame_pacer.wait()
                     frame_dt += last_physics_dt
                 
                 last_frame_dt = frame_dt
@@ -77,6 +95,71 @@ class BaseScene:
 
         return self.return_value
 
+    def run_fixed_timestep(self):
+        """
+        Physics (and estimation) run with a constant dt of 1/physics_rate, as many times as needed to catch up
+        with the real time, independently of the drawing which happens once per frame at fps_target.
+        At most max_physics_steps are run per frame, so that a long hitch slows the simulation down instead of freezing it.
+        """
+        self.continuer      = True
+        frame_length        = 1/self.options.fps_target
+        physics_dt          = 1/self.options.physics_rate
+        max_physics_steps   = getattr(self.options, "max_physics_steps", 5)
+
+        accumulator         = 0
+        last_frame_dt       = 0
+
+        self.frame_pacer    = FramePacer(frame_length, getattr(self.options, "pacing_spin_ms", 2) / 1000)
+        self.frame_pacer.start()
+
+        while self.continuer:
+            try:
+                self._update(last_frame_dt)
+
+                accumulator += min(last_frame_dt, max_physics_steps * physics_dt)
+                while accumulator >= physics_dt:
+                    self._physics_update(physics_dt)
+                    accumulator -= physics_dt
+                self.physics_alpha = accumulator / physics_dt
+
+                if self._should_draw(last_frame_dt, frame_length):
+                    self._draw()
+                if pygame.event.peek(QUIT, False):
+                    self.continuer = False
+
+                last_frame_dt = self.frame_pacer.wait()
+
+                self.last_frame_dt = last_frame_dt
+                if self.last_frame_dt > 0:
+                    self.instant_fps = 1/self.last_frame_dt
+                else:
+                    self.instant_fps = float('inf')
+            except Exception as e:
+                self.continuer = False
+                raise e
+
+        return self.return_value
+
+    def _should_draw(self, dt, frame_length):
+        """
+        Decimates the drawing: only one frame every draw_divisor frames is drawn,
+        and no more than max_draw_fps frames per second (if set)
+        """
+        self.frame_count += 1
+        self.draw_elapsed += dt
+
+        draw = self.frame_count % self.draw_divisor == 0
+        if draw and self.max_draw_fps:
+            draw_period = 1/self.max_draw_fps
+            # Half a frame of tolerance, so that 120 fps drawn at 30 fps is exactly one frame out of 4
+            draw = self.draw_elapsed + frame_length / 2 >= draw_period
+            if draw:
+                self.draw_elapsed = min(self.draw_elapsed - draw_period, draw_period)
+        elif draw:
+            self.draw_elapsed = 0
+
+        return draw
+
     def swap_scene(self, scene):
         """
         Used to quit the current scene and go to "scene"
@@ -97,10 +180,73 @@ class BaseScene:
     def _physics_update(self, dt):
         self.physics_update(dt)
 
-    def _draw(self):
-        # self.window
+    def add_dirty_rect(self, rect):
+        """
+        Marks a region of the window as drawn during this frame (used by the dirty rectangles rendering)
+
+        Arguments:
+            rect: pygame.Rect -> The region, in the window frame
+        """
+        if self.dirty_rendering and rect is not None:
+            self.dirty_rects.append(rect)
+        return rect
+
+    def request_full_redraw(self):
+        """
+        The whole window is cleared and updated on the next frame (camera moved, new scene...)
+        """
+        self.full_redraw = True
+
+    def draw_background(self):
+        """
+        Erases the whole window
+        """
         self.window.fill(self.options.background_color)
+
+    def clear_rects(self, rects):
+        """
+        Erases the regions drawn on the previous frame
+
+        Arguments:
+            rects: list -> pygame.Rect in the window frame
+        """
+        for rect in rects:
+            self.clear_rect(rect)
+
+    def clear_rect(self, rect):
+        """
+        Erases a region of the window
+
+        Arguments:
+            rect: pygame.Rect -> The region, in the window frame
+        """
+        self.window.fill(self.options.background_color, rect)
+
+    def _draw(self):
+        if not self.dirty_rendering:
+            self.draw_background()
+            self.draw(self.window)
+
+            pygame.display.update()
+            return
+
+        # Erase what was drawn on the previous frame, draw, and update both the old and new regions
+        if self.full_redraw:
+            self.draw_background()
+        else:
+            self.clear_rects(self.previous_dirty_rects)
+
+        self.dirty_rects = []
         self.draw(self.window)
-        
-        pygame.display.update()
+
+        window_rect = self.window.get_rect()
+        dirty_rects = [rect.clip(window_rect) for rect in self.dirty_rects]
+        dirty_rects = [rect for rect in dirty_rects if rect.width > 0 and rect.height > 0]
+
+        if self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.previous_dirty_rects + dirty_rects)
+        self.previous_dirty_rects = dirty_rects
 
@@ -0,0 +1,123 @@
+import time
+import math
+
+class TickStatistics:
+    def __init__(self):
+        """
+        Running statistics of tick periods and lateness (ns)
+        """
+        self.reset()
+
+    def reset(self):
+        # Welford's running mean / variance of the tick periods
+        self.num_ticks          = 0
+        self.mean_period_ns     = 0
+        self.m2_period_ns       = 0
+        self.max_period_ns      = 0
+        self.max_lateness_ns    = 0
+        self.num_missed         = 0 # Ticks whose work took longer than the period
+
+    def add(self, period, lateness, missed):
+        self.num_ticks += 1
+        delta = period - self.mean_period_ns
+        self.mean_period_ns += delta / self.num_ticks
+        self.m2_period_ns += delta * (period - self.mean_period_ns)
+        if period > self.max_period_ns:
+            self.max_period_ns = period
+        if lateness > self.max_lateness_ns:
+            self.max_lateness_ns = lateness
+        if missed:
+            self.num_missed += 1
+
+    def to_dict(self, target_period_ns):
+        """
+        Returns the statistics, in milliseconds
+        """
+        jitter = math.sqrt(self.m2_period_ns / self.num_ticks) if self.num_ticks > 0 else 0
+        return {
+            "ticks": self.num_ticks,
+            "target_period_ms": target_period_ns / 1e6,
+            "mean_period_ms": self.mean_period_ns / 1e6,
+            "jitter_ms": jitter / 1e6,
+            "max_period_ms": self.max_period_ns / 1e6,
+            "max_lateness_ms": self.max_lateness_ns / 1e6,
+            "missed": self.num_missed
+        }
+
+
+class FramePacer:
+    def __init__(self, period, spin_duration=0.002):
+        """
+        Holds a constant tick period using absolute deadlines on time.perf_counter_ns.
+        It sleeps until spin_duration before the deadline (time.sleep usually overshoots by a millisecond or more),
+        then busy-waits for the rest.
+
+        Arguments:
+            period: float -> The tick period (s)
+            spin_duration: float -> How long before the deadline to stop sleeping and start spinning (s)
+        """
+        self.period_ns          = int(period * 1e9)
+        self.spin_duration_ns   = int(spin_duration * 1e9)
+        self.next_deadline_ns   = None
+        self.last_tick_ns       = None
+
+        # Statistics of the whole run, and of the ticks since the last window_stats call (for live displays)
+        self.run_stats          = TickStatistics()
+        self.window             = TickStatistics()
+
+    @property
+    def num_ticks(self):
+        return self.run_stats.num_ticks
+
+    def reset_stats(self):
+        self.run_stats.reset()
+        self.window.reset()
+
+    def start(self):
+        self.last_tick_ns = time.perf_counter_ns()
+        self.next_deadline_ns = self.last_tick_ns + self.period_ns
+
+    def wait(self):
+        """
+        Waits for the next deadline, and returns the time elapsed since the previous tick (s)
+        """
+        if self.next_deadline_ns is None:
+            self.start()
+
+        now = time.perf_counter_ns()
+        remaining = self.next_deadline_ns - now
+        missed = remaining <= 0
+        if not missed:
+            if remaining > self.spin_duration_ns:
+                time.sleep((remaining - self.spin_duration_ns) / 1e9)
+            while time.perf_counter_ns() < self.next_deadline_ns:
+                pass
+            now = time.perf_counter_ns()
+
+        lateness = now - self.next_deadline_ns
+
+        # Late by more than a tick, resynchronize instead of trying to catch up with a burst of ticks
+        if lateness > self.period_ns:
+            self.next_deadline_ns = now + self.period_ns
+        else:
+            self.next_deadline_ns += self.period_ns
+
+        period = now - self.last_tick_ns
+        self.last_tick_ns = now
+        self.run_stats.add(period, lateness, missed)
+        self.window.add(period, lateness, missed)
+        return period / 1e9
+
+    def stats(self):
+        """
+        Returns the tick timing statistics of the whole run, in milliseconds
+        """
+        return self.run_stats.to_dict(self.period_ns)
+
+    def window_stats(self):
+        """
+        Returns the tick timing statistics since the previous call, in milliseconds, and starts a new window
+        """
+        stats = self.window.to_dict(self.period_ns)
+        self.window.reset()
+        return stats
@@ -2,9 +2,48 @@ import pygame
 from pygame.locals import *
 
 import math
+import numpy as np
 
 from lib.Math.Vector import Vector2
 
+
+def to_display_frame(points, curve_range: dict, display_size: Vector2):
+    """
+    Vectorized transform of (N, 2) points to the display frame of a curve (y axis pointing down), as floats
+    """
+    x_min, x_max = curve_range['X']['MIN'], curve_range['X']['MAX']
+    y_min, y_max = curve_range['Y']['MIN'], curve_range['Y']['MAX']
+
+    display_points = np.empty(np.shape(points))
+    display_points[:, 0] = (points[:, 0] - x_min) / (x_max - x_min) * display_size.x
+    display_points[:, 1] = display_size.y - (points[:, 1] - y_min) / (y_max - y_min) * display_size.y
+    return display_points
+
+def decimate_min_max(draw_points):
+    """
+    Level of detail for (N, 2) integer draw points: each run of consecutive points in the same pixel column
+    is reduced to its first, lowest, highest and last points, which cover exactly the same pixels.
+    A curve with more points than pixels is then drawn with at most 4 points per column
+    """
+    if len(draw_points) < 4:
+        return draw_points
+
+    columns = draw_points[:, 0]
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    if 4 * len(starts) >= len(draw_points):
+        return draw_points
+    ends = np.r_[starts[1:], len(draw_points)] - 1
+
+    y = draw_points[:, 1]
+    envelope = np.empty((len(starts), 4, 2), dtype=draw_points.dtype)
+    envelope[:, :, 0] = columns[starts, None]
+    envelope[:, 0, 1] = y[starts]
+    envelope[:, 1, 1] = np.minimum.reduceat(y, starts)
+    envelope[:, 2, 1] = np.maximum.reduceat(y, starts)
+    envelope[:, 3, 1] = y[ends]
+    return envelope.reshape(-1, 2)
+
+
 class Curve:
     AXIS_KEYS = ['X', 'Y']
     RANGE_KEYS = ['MIN', 'MAX']
@@ -88,23 +127,110 @@ class Curve:
 
     # def )
     def update_draw_points(self):
-        self.draw_points = []
+        if len(self.points) == 0:
+            self.draw_points = np.empty((0, 2), dtype=int)
+        else:
+            points = np.array([(point.x, point.y) for point in self.points], dtype=float)
+            self.draw_points = to_display_frame(points, self.range, self.display_size).astype(int)
 
-        # self.range['VALUE'] = self.range['MIN'] + (self.range['MAX'] - self.range['MIN']) * (self.cursor.position.x + self.cursor_radius - self.position.x) / self.size.x
-
-        for point in self.points:
-            p = Vector2(
-                (point.x - self.range['X']['MIN']) / (self.range['X']['MAX'] - self.range['X']['MIN']) * (self.display_size.x),
-                self.display_size.y - (point.y - self.range['Y']['MIN']) / (self.range['Y']['MAX'] - self.range['Y']['MIN']) * (self.display_size.y)
-            )
-            self.draw_points.append(p.to_int())
+        # Decimated points actually drawn, only recomputed with the draw points
+        self.line_points = decimate_min_max(self.draw_points).tolist()
 
         
     def draw(self, surface):
-        if len(self.draw_points) > 1:
-            pointA = self.draw_points[0]
-            for pointB in self.draw_points[1:]:
+        if len(self.line_points) > 1:
+            pygame.draw.lines(surface, self.color, False, self.line_points, self.line_width)
+
+
+class StreamingCurve(Curve):
+    def __init__(self, capacity: int = 10000, x_span: float or None = None, color: list or None = None, line_width: int or None = None, display_size: Vector2 or None = None, range: dict or None = None):
+        """
+        Curve for real time plots: only the last capacity points are kept, in a NumPy ring buffer,
+        and the draw points are computed in one vectorized transform when drawing (not on every add).
+
+        Arguments:
+            capacity: int -> The maximum number of points, the oldest ones are overwritten
+            x_span: float -> If set, the X range follows the newest point: [x - x_span, x]
+        """
+        self.capacity   = capacity
+        self.buffer     = np.empty((capacity, 2))
+        self.head       = 0 # Index of the next point to write
+        self.length     = 0
+        self.x_span     = x_span
+
+        self.draw_points_outdated = True
+        super().__init__(color, None, None, line_width, None, range)
+        self.update_draw_points_every_add = False
+
+        if display_size:
+            self.set_display_size(display_size)
+
+    @property
+    def points(self):
+        return self.get_points()
+
+    @points.setter
+    def points(self, points):
+        self.clear()
+        for point in points:
+            self.add_point(point)
+
+    def get_points(self):
+        """
+        Returns a (N, 2) copy of the points, from the oldest to the newest
+        """
+        if self.length < self.capacity:
+            return self.buffer[:self.length].copy()
+        return np.concatenate([self.buffer[self.head:], self.buffer[:self.head]])
+
+    def clear(self):
+        self.head = 0
+        self.length = 0
+        self.draw_points_outdated = True
+        return self
 
-                pygame.draw.line(surface, self.color, pointA.to_pygame(), pointB.to_pygame(), self.line_width)
+    def set_range(self, range: dict):
+        super().set_range(range)
+        self.draw_points_outdated = True
+        return self
 
-                pointA = pointB
\ No newline at end of file
+    def set_display_size(self, size: Vector2):
+        self.display_size = size
+        self.draw_points_outdated = True
+        return self
+
+    def add_point(self, v: Vector2):
+        return self.add_sample(v.x, v.y)
+
+    def add_sample(self, x: float, y: float):
+        self.buffer[self.head, 0] = x
+        self.buffer[self.head, 1] = y
+        self.head = (self.head + 1) % self.capacity
+        if self.length < self.capacity:
+            self.length += 1
+
+        if self.x_span is not None:
+            self.range['X']['MIN'] = x - self.x_span
+            self.range['X']['MAX'] = x
+
+        self.draw_points_outdated = True
+        return self
+
+    def update_draw_points(self):
+        self.draw_points_outdated = False
+        if not self.display_size or self.length == 0:
+            self.draw_points = np.empty((0, 2), dtype=int)
+            self.line_points = []
+            return
+
+        points = self.get_points()
+        if self.x_span is not None:
+            # Points are added with increasing x, the ones that scrolled out of the range are skipped
+            points = points[np.searchsorted(points[:, 0], self.range['X']['MIN']):]
+        self.draw_points = to_display_frame(points, self.range, self.display_size).astype(int)
+        self.line_points = decimate_min_max(self.draw_points).tolist()
+
+    def draw(self, surface):
+        if self.draw_points_outdated:
+            self.update_draw_points()
+        super().draw(surface)
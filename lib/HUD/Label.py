@@ -5,6 +5,14 @@ from lib.Math.Vector import Vector2
 
 from lib.HUD.CanvasItem import CanvasItem
 
+from collections import OrderedDict
+import weakref
+
+# Caches shared by all the labels
+GLYPH_WIDTHS            = weakref.WeakKeyDictionary()   # font -> {char: advance in px}
+RENDERED_LINES          = weakref.WeakKeyDictionary()   # font -> {(text, color): surface}, least recently used first
+RENDERED_LINES_MAX_SIZE = 512                           # Per font
+
 
 class Label(CanvasItem):
     TEXT_LEFT       = 0
@@ -57,21 +65,64 @@ class Label(CanvasItem):
         self.load()
         return self
 
+    def get_text_width_estimate(self, text):
+        """
+        Width of the text in px from the cached glyph advances (kerning is ignored, so it can be off by a few px)
+        """
+        widths = GLYPH_WIDTHS.get(self.font)
+        if widths is None:
+            widths = GLYPH_WIDTHS[self.font] = {}
+
+        width = 0
+        for char in text:
+            glyph_width = widths.get(char)
+            if glyph_width is None:
+                metrics = self.font.metrics(char)[0]
+                glyph_width = widths[char] = metrics[4] if metrics else self.font.size(char)[0]
+            width += glyph_width
+        return width
+
+    def line_fits(self, estimated_width, length, words):
+        """
+        Whether the words joined by spaces fit in the label's width.
+        The estimate is trusted when it is far enough from the limit, otherwise the exact width is computed
+        """
+        tolerance = 2 + length // 2
+        if estimated_width + tolerance <= self.size.x:
+            return True
+        if estimated_width - tolerance > self.size.x:
+            return False
+        return self.font.size(' '.join(words))[0] <= self.size.x
+
     def load(self):
         if self.word_wrapping:
             self.lines = []
             words = self.text.split(' ')
-            sentence = words[0]
+
+            # Words of the current line, with their cumulative width and length
+            sentence = [words[0]]
+            sentence_width = self.get_text_width_estimate(words[0])
+            sentence_length = len(words[0])
+            space_width = self.get_text_width_estimate(' ')
             for word in words[1:]:
                 if word == '\t':
                     word = '    '
 
-                if self.font.size(sentence + " " + word)[0] <= self.size.x and word != '\n':
-                    sentence += ' ' + word
+                word_width = self.get_text_width_estimate(word)
+                width = sentence_width + space_width + word_width
+                length = sentence_length + 1 + len(word)
+                sentence.append(word)
+                if word != '\n' and self.line_fits(width, length, sentence):
+                    sentence_width = width
+                    sentence_length = length
                 else:
-                    self.add_line(sentence)
-                    sentence = word
+                    sentence.pop()
+                    self.add_line(' '.join(sentence))
+                    sentence = [word]
+                    sentence_width = word_width
+                    sentence_length = len(word)
             
+            sentence = ' '.join(sentence)
             if sentence.strip() != '':
                 self.add_line(sentence)
         
@@ -84,7 +135,7 @@ class Label(CanvasItem):
         for forbidden_char in self.NO_PRINT_CHARS:
             text = text.replace(forbidden_char, '')
 
-        surface = self.font.render(text, True, self.color)
+        surface = self.render_line(text)
         width = surface.get_width()
         xoffset = 0
         if self.text_align == self.TEXT_CENTERED:
@@ -99,6 +150,28 @@ class Label(CanvasItem):
         })
 
 
+    def render_line(self, text):
+        """
+        Renders a line of text, or reuses the surface if the same line was rendered recently (by any label)
+        """
+        # Keyed by font first so that the cache doesn't keep the fonts alive
+        lines = RENDERED_LINES.get(self.font)
+        if lines is None:
+            lines = RENDERED_LINES[self.font] = OrderedDict()
+
+        key = (text, tuple(self.color))
+        surface = lines.get(key)
+        if surface is not None:
+            lines.move_to_end(key)
+            return surface
+
+        surface = self.font.render(text, True, self.color)
+        lines[key] = surface
+        if len(lines) > RENDERED_LINES_MAX_SIZE:
+            lines.popitem(last=False)
+        return surface
+
+
     def set_text_align(self, code: int):
         if 0 <= code <= 2:
             self.text_align = code
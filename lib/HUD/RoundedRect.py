@@ -47,6 +47,9 @@ class RoundedRect(CanvasItem):
 
         self.set_corners(corners_code)
 
+        # Stretch a small cached rounded rect instead of caching one surface per size (for rects resized often)
+        self.nine_slice = False
+
         # self.position           = Vector2(self.parent.size.x * self.position_ratio.x, self.parent.size.y * self.position_ratio.y)
         # self.size               = Vector2(self.parent.size.x * self.size_ratio.x, self.parent.size.y * self.size_ratio.y)
 
@@ -90,7 +93,10 @@ class RoundedRect(CanvasItem):
     def load(self):
         if self.color == None:
             raise AttributeError('Color not set')
-        self.surface            = cd.rounded_surface(self.size, self.radius, self.color, self.corners_code)
+        if self.nine_slice:
+            self.surface        = cd.nine_slice_rounded_surface(self.size, self.radius, self.color, self.corners_code)
+        else:
+            self.surface        = cd.cached_rounded_surface(self.size, self.radius, self.color, self.corners_code)
         return self
 
     def draw(self):
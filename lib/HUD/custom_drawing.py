@@ -3,6 +3,12 @@ from pygame.locals import *
 
 from lib.Math.Vector import Vector2
 
+from collections import OrderedDict
+
+# Surfaces shared by all the rounded rects, least recently used first. They must not be drawn on
+ROUNDED_SURFACES            = OrderedDict()
+ROUNDED_SURFACES_MAX_SIZE   = 256
+
 def rounded_surface(size : Vector2, radius : int, color: list or tuple, corners_code: int):
     ALPHA_COLOR = [111,184,241] # Devrait changer en fonction de color
 
@@ -37,3 +43,86 @@ def rounded_surface(size : Vector2, radius : int, color: list or tuple, corners_
     surface.set_colorkey(ALPHA_COLOR)
 
     return surface
+
+
+def cached_rounded_surface(size : Vector2, radius : int, color: list or tuple, corners_code: int):
+    """
+    Same as rounded_surface, but the surface is shared with every rounded rect of the same size, radius, color and corners
+    """
+    key = ("full", int(size.x), int(size.y), radius, tuple(color), corners_code)
+    surface = ROUNDED_SURFACES.get(key)
+    if surface is not None:
+        ROUNDED_SURFACES.move_to_end(key)
+        return surface
+
+    surface = rounded_surface(size, radius, color, corners_code)
+    _cache_rounded_surface(key, surface)
+    return surface
+
+
+def nine_slice(source: pygame.Surface, size : Vector2, border: int, fill_color: list or tuple or None = None):
+    """
+    Stretches a surface to any size without deforming its borders:
+    the corners (border x border px) are copied, the edges are stretched along one axis and the center along both
+
+    Arguments:
+        source: pygame.Surface -> The surface to stretch, at least 2 * border + 1 px wide and high
+        size: Vector2 -> The size of the result
+        border: int -> The size of the borders in px
+        fill_color: tuple -> If the edges and the center are of a single color, they are filled instead of stretched
+    """
+    width, height = int(size.x), int(size.y)
+    source_width, source_height = source.get_size()
+    inner_width, inner_height = width - 2 * border, height - 2 * border
+    source_inner_width, source_inner_height = source_width - 2 * border, source_height - 2 * border
+
+    surface = pygame.Surface((width, height), source.get_flags())
+    colorkey = source.get_colorkey()
+    if colorkey:
+        surface.set_colorkey(colorkey)
+    surface.fill(fill_color if fill_color is not None else colorkey or (0, 0, 0))
+
+    # (x, width) in the source and in the result, for the 3 columns and rows
+    columns = [(0, 0, border, border), (border, border, source_inner_width, inner_width), (source_width - border, width - border, border, border)]
+    rows    = [(0, 0, border, border), (border, border, source_inner_height, inner_height), (source_height - border, height - border, border, border)]
+    for source_x, x, source_w, w in columns:
+        for source_y, y, source_h, h in rows:
+            if w <= 0 or h <= 0:
+                continue
+            if fill_color is not None and (source_w != border or source_h != border):
+                continue # Edge or center, already filled
+            tile = source.subsurface((source_x, source_y, source_w, source_h))
+            if (w, h) != (source_w, source_h):
+                tile = pygame.transform.scale(tile, (w, h))
+            if colorkey:
+                surface.fill(colorkey, (x, y, w, h)) # The transparent pixels of the tile are not blitted
+            surface.blit(tile, (x, y))
+    return surface
+
+
+def nine_slice_rounded_surface(size : Vector2, radius : int, color: list or tuple, corners_code: int):
+    """
+    Same as rounded_surface, but only a small rounded rect is rasterized (once per radius, color and corners)
+    and stretched to the size, for rects that are resized often
+    """
+    radius = int(radius)
+    key = ("nine_slice", radius, tuple(color), corners_code)
+    source = ROUNDED_SURFACES.get(key)
+    if source is not None:
+        ROUNDED_SURFACES.move_to_end(key)
+    else:
+        # Wide enough for the corners not to overlap each other
+        source_size = 4 * radius + 1
+        source = rounded_surface(Vector2(source_size, source_size), radius, color, corners_code)
+        _cache_rounded_surface(key, source)
+
+    if size.x < 2 * radius + 1 or size.y < 2 * radius + 1:
+        return rounded_surface(size, radius, color, corners_code)
+    # Everything but the corners is of the rect's color
+    return nine_slice(source, size, radius, color)
+
+
+def _cache_rounded_surface(key, surface):
+    ROUNDED_SURFACES[key] = surface
+    if len(ROUNDED_SURFACES) > ROUNDED_SURFACES_MAX_SIZE:
+        ROUNDED_SURFACES.popitem(last=False)
@@ -46,11 +46,11 @@ class BaseModel:
         self.path_drawer = PathDrawer(max_num_points, color, radius)
 
     def computeNextState(self, dt):
-        if self.path_drawer and self.kinematic_center_velocity != 0:
+        if self.path_drawer is not None and self.kinematic_center_velocity != 0:
             self.path_drawer.addPoint(self.position)
 
     def draw(self, scene, fenetre):
-        if self.path_drawer:
+        if self.path_drawer is not None:
             self.path_drawer.draw(scene)
 
     def create_covariance_ellipse(self, covariance_matrix, confidence_prc=0.99):
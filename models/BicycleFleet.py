@@ -0,0 +1,172 @@
+from lib.Math.Vector import Vector2 as V
+
+from lib.colors import *
+
+from models.BicycleModel import BicycleModel
+
+import numpy as np
+
+class BicycleFleet:
+    draw_bounding_box_color = BicycleModel.draw_bounding_box_color
+    draw_bounding_box_width = BicycleModel.draw_bounding_box_width
+
+    INTEGRATORS = ["euler", "arc", "rk4"]
+
+    def __init__(self, bounding_box_size: V, kinematic_center_offset: V, wheelbases, base_positions, base_thetas_rad, integrator: str = "euler") -> None:
+        """N bicycle models stepped together, with their state held in contiguous arrays
+
+        Args:
+            bounding_box_size (V): The size of the bounding box of the vehicles (only used for drawing)
+            kinematic_center_offset (V): The offset of the kinematic center from the bottom left corner of the vehicles
+            wheelbases (float or array like): The distance between the front and back wheels, one per vehicle or shared
+            base_positions (array like): (N, 2) initial positions of the vehicles
+            base_thetas_rad (float or array like): The initial angles of the vehicles
+            integrator (str, optional): "euler", "arc" or "rk4", see BicycleModel. Defaults to "euler".
+        """
+        self.bounding_box_size = bounding_box_size
+        self.kinematic_center_offset = kinematic_center_offset
+
+        if integrator not in self.INTEGRATORS:
+            raise Exception(f"integrator should be one of {self.INTEGRATORS}")
+        self.integrator = integrator
+
+        # The fleet's state, one column per vehicle: x, y, theta
+        self.state = np.array(base_positions, dtype=float).reshape(-1, 2)
+        self.num_vehicles = len(self.state)
+        self.state = np.column_stack([self.state, np.empty(self.num_vehicles)])
+        self.state[:, 2] = base_thetas_rad
+
+        self.wheelbase = np.empty(self.num_vehicles)
+        self.wheelbase[:] = wheelbases
+
+        # The models state derivates
+        self.state_dot = np.zeros((self.num_vehicles, 3))
+
+        # The inputs the models receive
+        self.steering_rad = np.zeros(self.num_vehicles)
+        self.velocity = np.zeros(self.num_vehicles)
+
+    @classmethod
+    def fromModels(cls, models):
+        """Builds a fleet from a list of BicycleModel (the bounding box of the first one is used for drawing)
+        """
+        # The fleet has no per vehicle adaptive step size, rk4 is the closest in accuracy
+        integrator = models[0].integrator
+        if integrator == "adaptive":
+            integrator = "rk4"
+
+        fleet = cls(
+            models[0].bounding_box_size,
+            models[0].kinematic_center_offset,
+            [model.wheelbase for model in models],
+            [(model.position.x, model.position.y) for model in models],
+            [model.theta_rad for model in models],
+            integrator
+        )
+        fleet.receiveInputs(
+            [model.steering_rad for model in models],
+            [model.velocity for model in models]
+        )
+        return fleet
+
+    # Views on the state arrays
+    @property
+    def x(self):
+        return self.state[:, 0]
+
+    @property
+    def y(self):
+        return self.state[:, 1]
+
+    @property
+    def theta_rad(self):
+        return self.state[:, 2]
+
+    @property
+    def positions(self):
+        return self.state[:, 0:2]
+
+
+    @staticmethod
+    def derivatives(state, steering_rad, velocity, wheelbase, out=None):
+        """Kinematic bicycle derivatives [x_dot, y_dot, theta_dot] for any number of states
+
+        Args:
+            state (np.ndarray): (..., 3) states [x, y, theta]
+            steering_rad (float or np.ndarray): The steering inputs, broadcastable to state[..., 0]
+            velocity (float or np.ndarray): The velocity inputs, broadcastable to state[..., 0]
+            wheelbase (float or np.ndarray): The wheelbases, broadcastable to state[..., 0]
+            out (np.ndarray, optional): Array of the same shape as state to write the result into
+        """
+        if out is None:
+            out = np.empty(np.shape(state))
+        theta = state[..., 2]
+        np.multiply(velocity, np.cos(theta), out=out[..., 0])
+        np.multiply(velocity, np.sin(theta), out=out[..., 1])
+        np.multiply(velocity, np.tan(steering_rad), out=out[..., 2])
+        out[..., 2] /= wheelbase
+        return out
+
+
+    def receiveInputs(self, steering_angles_rad, velocities):
+        self.steering_rad[:] = steering_angles_rad
+        self.velocity[:] = velocities
+
+
+    def computeStateDerivatives(self, dt):
+        self.derivatives(self.state, self.steering_rad, self.velocity, self.wheelbase, out=self.state_dot)
+
+
+    def computeNextState(self, dt):
+        if self.integrator == "euler":
+            # Apply euler forward discretization with step size dt
+            self.state += dt * self.state_dot
+        else:
+            theta = self.state[:, 2]
+            dtheta = dt * self.state_dot[:, 2]
+            distance = dt * self.velocity
+
+            if self.integrator == "arc":
+                # Exact circular arcs, the straight lines are handled apart to avoid dividing by zero
+                straight = np.abs(dtheta) < 1e-9
+                safe_dtheta = np.where(straight, 1, dtheta)
+                self.state[:, 0] += distance * np.where(straight, np.cos(theta), (np.sin(theta + dtheta) - np.sin(theta)) / safe_dtheta)
+                self.state[:, 1] += distance * np.where(straight, np.sin(theta), (np.cos(theta) - np.cos(theta + dtheta)) / safe_dtheta)
+            else:
+                # Runge kutta 4, theta is linear over the step
+                theta_mid = theta + dtheta / 2
+                theta_end = theta + dtheta
+                self.state[:, 0] += distance / 6 * (np.cos(theta) + 4 * np.cos(theta_mid) + np.cos(theta_end))
+                self.state[:, 1] += distance / 6 * (np.sin(theta) + 4 * np.sin(theta_mid) + np.sin(theta_end))
+            self.state[:, 2] += dtheta
+
+        np.mod(self.state[:, 2], 2 * np.pi, out=self.state[:, 2])
+
+    def getNoisyVelocity(self):
+        return self.velocity * (1 + np.random.normal(0, 0.10 / 3, self.num_vehicles))
+
+    def getNoisySteering(self):
+        return self.steering_rad + np.random.normal(0, (np.pi / 20) / 3, self.num_vehicles)
+
+    def getNoisyPosition(self):
+        return self.positions + np.random.normal(0, 0.40 / 3, (self.num_vehicles, 2))
+
+
+    def getModel(self, i) -> BicycleModel:
+        """Returns a standalone BicycleModel copy of the i-th vehicle (for drawing or debugging)
+        """
+        model = BicycleModel(self.bounding_box_size, self.kinematic_center_offset, float(self.wheelbase[i]), V(self.state[i, 0:2]), float(self.state[i, 2]), self.integrator)
+        model.receiveInputs(float(self.steering_rad[i]), float(self.velocity[i]))
+        return model
+
+
+    def draw(self, scene, fenetre):
+        for x, y, theta in self.state.tolist():
+            scene.draw_rotated_rectangle(
+                V(x, y),
+                theta,
+                self.bounding_box_size,
+                self.kinematic_center_offset,
+                self.draw_bounding_box_color,
+                self.draw_bounding_box_width
+            )
@@ -8,7 +8,9 @@ import math
 import numpy as np
 
 class BicycleModel(BaseModel):
-    def __init__(self, bounding_box_size: V, kinematic_center_offset: V, wheelbase: float, base_position: V, base_theta_rad: float) -> None:
+    INTEGRATORS = ["euler", "arc", "rk4", "adaptive"]
+
+    def __init__(self, bounding_box_size: V, kinematic_center_offset: V, wheelbase: float, base_position: V, base_theta_rad: float, integrator: str = "euler") -> None:
         """Basic bicycle model
 
         Args:
@@ -17,6 +19,12 @@ class BicycleModel(BaseModel):
             wheelbase (float): The distance between the front and back wheels
             base_position (V): The initial position of the vehicle
             base_theta_rad (float): The initial angle of the vehicle
+            integrator (str, optional): How computeNextState integrates the model over dt, one of
+                "euler": explicit euler (error grows with dt),
+                "arc": exact circular arc, exact as long as the inputs are constant over dt,
+                "rk4": runge kutta 4,
+                "adaptive": runge kutta 4 sub steps, sized by step doubling to keep the position error under adaptive_tolerance.
+                Defaults to "euler".
         """
         super().__init__()
         
@@ -25,6 +33,13 @@ class BicycleModel(BaseModel):
         self.kinematic_center_offset = kinematic_center_offset
         self.wheelbase = wheelbase
 
+        if integrator not in self.INTEGRATORS:
+            raise Exception(f"integrator should be one of {self.INTEGRATORS}")
+        self.integrator = integrator
+        self.adaptive_tolerance = 1e-6 # m
+        self.adaptive_min_step = 1e-5 # s
+        self.adaptive_step = None # Last accepted sub step, reused as the first guess of the next call
+
         # The models state initial conditions
         self.theta_rad = base_theta_rad
         self.position = base_position
@@ -43,10 +58,15 @@ class BicycleModel(BaseModel):
         self.hook_velocity_global = V()
         self.computeNextState(0)
 
+        # State before the last step, to interpolate the drawing between physics steps
+        self.previous_position = V(base_position)
+        self.previous_theta_rad = base_theta_rad
+
 
     def receiveInputs(self, steering_angle_rad, velocity):
         self.steering_rad = steering_angle_rad
         self.velocity = velocity
+        self.kinematic_center_velocity = velocity
 
 
     def computeStateDerivatives(self, dt):
@@ -56,11 +76,96 @@ class BicycleModel(BaseModel):
         self.theta_dot = self.velocity * math.tan(self.steering_rad) / self.wheelbase
 
 
-    def computeNextState(self, dt):        
-        # Apply euler forward discretization with step size dt
-        self.position.x += dt * self.x_dot
-        self.position.y += dt * self.y_dot
-        self.theta_rad  = (self.theta_rad + dt *  self.theta_dot) % (2 * math.pi)
+    def computeNextState(self, dt):
+        if self.integrator == "euler":
+            # Apply euler forward discretization with step size dt
+            self.position.x += dt * self.x_dot
+            self.position.y += dt * self.y_dot
+            self.theta_rad  = (self.theta_rad + dt *  self.theta_dot) % (2 * math.pi)
+        else:
+            if self.integrator == "arc":
+                x, y, theta = self._arcStep(self.position.x, self.position.y, self.theta_rad, dt)
+            elif self.integrator == "rk4":
+                x, y, theta = self._rk4Step(self.position.x, self.position.y, self.theta_rad, dt)
+            else:
+                x, y, theta = self._adaptiveStep(self.position.x, self.position.y, self.theta_rad, dt)
+
+            self.position.x = x
+            self.position.y = y
+            self.theta_rad = theta % (2 * math.pi)
+
+        # Trail
+        super().computeNextState(dt)
+
+
+    def _arcStep(self, x, y, theta, dt):
+        # With constant inputs the kinematic center follows a circle of radius wheelbase / tan(steering)
+        dtheta = dt * self.velocity * math.tan(self.steering_rad) / self.wheelbase
+        if abs(dtheta) < 1e-9:
+            return x + dt * self.velocity * math.cos(theta), y + dt * self.velocity * math.sin(theta), theta + dtheta
+
+        distance_over_angle = dt * self.velocity / dtheta
+        return (
+            x + distance_over_angle * (math.sin(theta + dtheta) - math.sin(theta)),
+            y + distance_over_angle * (math.cos(theta) - math.cos(theta + dtheta)),
+            theta + dtheta
+        )
+
+    def _rk4Step(self, x, y, theta, dt):
+        # theta_dot only depends on the inputs, so theta is linear over the step
+        theta_dot = self.velocity * math.tan(self.steering_rad) / self.wheelbase
+        theta_mid = theta + dt / 2 * theta_dot
+        theta_end = theta + dt * theta_dot
+
+        cos_mid = math.cos(theta_mid)
+        sin_mid = math.sin(theta_mid)
+        return (
+            x + dt / 6 * self.velocity * (math.cos(theta) + 4 * cos_mid + math.cos(theta_end)),
+            y + dt / 6 * self.velocity * (math.sin(theta) + 4 * sin_mid + math.sin(theta_end)),
+            theta_end
+        )
+
+    def _adaptiveStep(self, x, y, theta, dt):
+        remaining = dt
+        step = self.adaptive_step or dt
+        while remaining > 0:
+            h = min(step, remaining)
+
+            # Step doubling: one step of h against two steps of h / 2
+            full = self._rk4Step(x, y, theta, h)
+            half = self._rk4Step(*self._rk4Step(x, y, theta, h / 2), h / 2)
+            error = math.hypot(full[0] - half[0], full[1] - half[1])
+
+            if error <= self.adaptive_tolerance or h <= self.adaptive_min_step:
+                x, y, theta = half
+                remaining -= h
+                if error < self.adaptive_tolerance / 32:
+                    step *= 2
+            else:
+                step = h / 2
+
+        self.adaptive_step = step
+        return x, y, theta
+
+    def storePreviousState(self):
+        self.previous_position.x = self.position.x
+        self.previous_position.y = self.position.y
+        self.previous_theta_rad = self.theta_rad
+
+    def getInterpolatedPose(self, alpha):
+        """Returns the pose alpha of the way between the previous and the current state
+
+        Args:
+            alpha (float): 0 for the previous state, 1 for the current one
+
+        Returns:
+            (V, float): The position and angle
+        """
+        if alpha >= 1:
+            return self.position, self.theta_rad
+
+        dtheta = (self.theta_rad - self.previous_theta_rad + math.pi) % (2 * math.pi) - math.pi
+        return self.previous_position + (self.position - self.previous_position) * alpha, self.previous_theta_rad + alpha * dtheta
 
     def getNoisyVelocity(self):
         return self.velocity * (1 + np.random.normal(0, 0.10 / 3))
@@ -85,11 +190,14 @@ class BicycleModel(BaseModel):
         return self.position + point.rotate_by_angle(self.theta_rad)
 
 
-    def draw(self, scene, fenetre):
+    def draw(self, scene, fenetre, alpha=1):
+        super().draw(scene, fenetre)
+        position, theta_rad = self.getInterpolatedPose(alpha)
+
         # Draw the bounding box
         scene.draw_rotated_rectangle(
-            self.position, 
-            self.theta_rad, 
+            position, 
+            theta_rad, 
             self.bounding_box_size, 
             self.kinematic_center_offset,
             self.draw_bounding_box_color,
@@ -98,8 +206,8 @@ class BicycleModel(BaseModel):
 
         # Draw back "center wheel"
         scene.draw_rotated_rectangle(
-            self.position,
-            self.theta_rad,
+            position,
+            theta_rad,
             self.draw_back_wheel_size,
             self.draw_back_wheel_size/2,
             self.draw_back_wheel_color,
@@ -108,8 +216,8 @@ class BicycleModel(BaseModel):
 
         # Draw front "center wheel"
         scene.draw_rotated_rectangle(
-            self.vehicleFrameToGlobalFrame(V(self.wheelbase, 0)),
-            self.theta_rad + self.steering_rad,
+            position + V(self.wheelbase, 0).rotate_by_angle(theta_rad),
+            theta_rad + self.steering_rad,
             self.draw_front_wheel_size,
             self.draw_front_wheel_size/2,
             self.draw_front_wheel_color,
@@ -118,7 +226,7 @@ class BicycleModel(BaseModel):
 
         #Draw the vehicle's reference frame
         scene.draw_reference_frame(
-            self.position,
-            self.theta_rad,
+            position,
+            theta_rad,
             self.draw_reference_frame_size
         )
@@ -6,6 +6,7 @@ from lib.BaseScene import BaseScene
 from lib.colors import *
 
 from lib.Math.Vector import Vector2 as V
+import numpy as np
 import math
 
 
@@ -15,8 +16,27 @@ class EnhancedDrawScene(BaseScene):
         self.zoom_level = 1
         self.map_offset = V()
 
+        # Static world content, rendered once per camera position and blitted as the background
+        self.use_static_layer = getattr(self.options, "static_layer", True)
+        self.static_layer = None
+        self.static_layer_key = None
+
+        # Pre-rendered point sprites, by (color, radius)
+        self.point_sprites = {}
+
+        # Visible part of the world (x_min, y_min, x_max, y_max), computed once per frame, primitives outside of it are skipped
+        self.use_culling = getattr(self.options, "culling", True)
+        self.visible_world_rect = None
+
+        # Ellipses are drawn as polygons from precomputed unit circles, by number of segments
+        self.max_ellipse_segments = getattr(self.options, "ellipse_segments", 64)
+        self.unit_circles = {}
+
 
     def update(self, dt, events, no_move=False):
+        previous_zoom_level = self.zoom_level
+        previous_map_offset = V(self.map_offset)
+
         # Zoom in and out
         if not no_move:
             if events['zoom_in'] or events['zoom_out'] or events.mouse_wheel:
@@ -38,6 +58,91 @@ class EnhancedDrawScene(BaseScene):
                 mouse_motion = self.events.mouse.rel_pos # Vector in window frame
                 self.map_offset += mouse_motion
 
+        # Everything moved on screen
+        if self.zoom_level != previous_zoom_level or not self.map_offset.equals(previous_map_offset):
+            self.request_full_redraw()
+
+
+    def _draw(self):
+        self.update_visible_world_rect()
+        super()._draw()
+
+    def update_visible_world_rect(self):
+        if not self.use_culling:
+            self.visible_world_rect = None
+            return
+        corners = self.draw_frame_to_global_frame_array([(0, 0), (self.window_size.x, self.window_size.y)])
+        self.visible_world_rect = (
+            corners[:, 0].min(), corners[:, 1].min(),
+            corners[:, 0].max(), corners[:, 1].max()
+        )
+
+    def is_visible(self, x_min, y_min, x_max, y_max, margin_px=0):
+        """
+        Whether a bounding box in the global frame (grown by margin_px pixels) overlaps the visible part of the world
+
+        Arguments:
+            x_min, y_min, x_max, y_max: float -> The bounding box in the global frame
+            margin_px: float -> Size of the drawing outside of the bounding box (line widths, radii...) in px
+        """
+        if self.visible_world_rect is None:
+            return True
+        margin = (margin_px + 1) / (self.options.unit_vector_size_in_px * self.zoom_level)
+        visible = self.visible_world_rect
+        return x_max + margin >= visible[0] and x_min - margin <= visible[2] and y_max + margin >= visible[1] and y_min - margin <= visible[3]
+
+    def draw_static(self, fenetre):
+        """
+        Draws the content of the world that never moves (reference frame, grid, map...), in the global frame.
+        It is only called when the static layer needs to be rendered again, use invalidate_static_layer if it changes.
+        """
+        pass
+
+    def invalidate_static_layer(self):
+        self.static_layer_key = None
+        self.request_full_redraw()
+
+    def get_static_layer(self):
+        """
+        Returns the static layer, rendered again if the camera moved (or the window was resized) since the last time
+        """
+        key = (self.zoom_level, self.map_offset.x, self.map_offset.y, self.window.get_size())
+        if self.static_layer is None or key != self.static_layer_key:
+            if self.static_layer is None or self.static_layer.get_size() != self.window.get_size():
+                self.static_layer = pygame.Surface(self.window.get_size())
+            self.static_layer.fill(self.options.background_color)
+
+            # The drawing primitives draw on self.window, and their regions are not dirty on the window
+            window, dirty_rects = self.window, self.dirty_rects
+            self.window, self.dirty_rects = self.static_layer, []
+            try:
+                self.draw_static(self.static_layer)
+            finally:
+                self.window, self.dirty_rects = window, dirty_rects
+
+            self.static_layer_key = key
+        return self.static_layer
+
+    def draw_background(self):
+        if not self.use_static_layer:
+            self.window.fill(self.options.background_color)
+            self.draw_static(self.window)
+            return
+        self.window.blit(self.get_static_layer(), (0, 0))
+
+    def clear_rects(self, rects):
+        if not self.use_static_layer and rects:
+            # The static content erased with the regions is drawn again, once for the whole window
+            # (it is drawn over itself elsewhere, which is fine as long as it is opaque)
+            super().clear_rects(rects)
+            self.draw_static(self.window)
+            return
+        super().clear_rects(rects)
+
+    def clear_rect(self, rect):
+        if not self.use_static_layer:
+            return super().clear_rect(rect)
+        self.window.blit(self.get_static_layer(), rect, rect)
 
     def global_frame_to_draw_frame(self, vector: V):
         """
@@ -46,8 +151,13 @@ class EnhancedDrawScene(BaseScene):
         # res.x = vector.x * scale_factor + window_width / 2
         # res.y = -vector.y * scale_factor + window_height / 2
 
+        if type(vector) != V:
+            vector = V(vector)
         u = self.options.unit_vector_size_in_px * self.zoom_level
-        return V(vector) * V(u, -u) + self.map_offset + self.window_size / 2
+        return V(
+            vector.x * u + self.map_offset.x + self.window_size.x / 2,
+            vector.y * -u + self.map_offset.y + self.window_size.y / 2
+        )
 
 
     def draw_frame_to_global_frame(self, vector: V):
@@ -58,6 +168,45 @@ class EnhancedDrawScene(BaseScene):
         u = self.options.unit_vector_size_in_px * self.zoom_level
         return (V(vector) - self.map_offset - self.window_size / 2) * V(1/u, -1/u)
 
+
+    def global_frame_to_draw_frame_array(self, points, out=None):
+        """
+        Vectorized global_frame_to_draw_frame
+
+        Arguments:
+            points: np.ndarray -> (N, 2) points in the global frame
+            out: np.ndarray -> Optional (N, 2) float array to write the result into
+        Returns:
+            (N, 2) float array of the points in the drawing frame (use .astype(int) for the same result as to_pygame)
+        """
+        points = np.asarray(points, dtype=float)
+        if out is None:
+            out = np.empty(points.shape)
+        u = self.options.unit_vector_size_in_px * self.zoom_level
+        np.multiply(points, (u, -u), out=out)
+        out += (self.map_offset.x, self.map_offset.y)
+        out += (self.window_size.x / 2, self.window_size.y / 2)
+        return out
+
+
+    def draw_frame_to_global_frame_array(self, points, out=None):
+        """
+        Vectorized draw_frame_to_global_frame
+
+        Arguments:
+            points: np.ndarray -> (N, 2) points in the drawing frame
+            out: np.ndarray -> Optional (N, 2) float array to write the result into
+        Returns:
+            (N, 2) float array of the points in the global frame
+        """
+        points = np.asarray(points, dtype=float)
+        if out is None:
+            out = np.empty(points.shape)
+        u = self.options.unit_vector_size_in_px * self.zoom_level
+        np.subtract(points, (self.map_offset.x + self.window_size.x / 2, self.map_offset.y + self.window_size.y / 2), out=out)
+        out *= (1/u, -1/u)
+        return out
+
     def dist_global_to_draw(self, dist):
         return dist * self.options.unit_vector_size_in_px * self.zoom_level
 
@@ -75,9 +224,60 @@ class EnhancedDrawScene(BaseScene):
             width: int -> Width in px
         """
 
+        if not self.is_visible(point.x, point.y, point.x, point.y, radius):
+            return None
+
         # Uses gfxdraw instead of draw to avoid the bug where a point becomes a line if drawn out of the screen
         # https://github.com/pygame/pygame/issues/3778
-        pygame.gfxdraw.filled_circle(self.window, *self.global_frame_to_draw_frame(point).to_pygame(), radius, color)
+        x, y = self.global_frame_to_draw_frame(point).to_pygame()
+        pygame.gfxdraw.filled_circle(self.window, x, y, radius, color)
+        return self.add_dirty_rect(pygame.Rect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1))
+
+
+    def get_point_sprite(self, color: tuple, radius: int):
+        """
+        Returns a surface with a filled circle of the given color and radius, blitted like gfxdraw.filled_circle would draw it
+        """
+        key = (tuple(color), radius)
+        sprite = self.point_sprites.get(key)
+        if sprite is None:
+            # Drawn opaque on a colorkeyed surface, the alpha of the color applies to the whole sprite when blitting
+            sprite = pygame.Surface((2 * radius + 1, 2 * radius + 1))
+            sprite.fill(BLACK if tuple(color[:3]) != BLACK else WHITE)
+            sprite.set_colorkey(sprite.get_at((0, 0)))
+            pygame.gfxdraw.filled_circle(sprite, radius, radius, radius, color[:3])
+            if len(color) > 3:
+                sprite.set_alpha(color[3])
+            self.point_sprites[key] = sprite
+        return sprite
+
+
+    def draw_points(self, points, color: tuple, radius=5):
+        """
+        Draws many points on the window at once, same result as draw_point on each of them
+
+        Arguments:
+            points: np.ndarray -> (N, 2) positions of the points in the global frame
+            color: tuple -> color in rgb (or rgba)
+            radius: int -> Radius in px
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if self.visible_world_rect is not None and len(points) > 0:
+            margin = (radius + 1) / (self.options.unit_vector_size_in_px * self.zoom_level)
+            visible = self.visible_world_rect
+            x, y = points[:, 0], points[:, 1]
+            points = points[(x >= visible[0] - margin) & (x <= visible[2] + margin) & (y >= visible[1] - margin) & (y <= visible[3] + margin)]
+        if len(points) == 0:
+            return None
+
+        top_left = self.global_frame_to_draw_frame_array(points).astype(int)
+        top_left -= radius
+
+        sprite = self.get_point_sprite(color, radius)
+        rects = self.window.blits([(sprite, position) for position in top_left.tolist()], self.dirty_rendering)
+        if rects:
+            return self.add_dirty_rect(rects[0].unionall(rects[1:]))
+        return None
 
 
     def draw_circle(self, point: V, color: tuple, radius=5):
@@ -91,9 +291,14 @@ class EnhancedDrawScene(BaseScene):
             width: int -> Width in px
         """
 
+        if not self.is_visible(point.x, point.y, point.x, point.y, radius):
+            return None
+
         # Uses gfxdraw instead of draw to avoid the bug where a point becomes a line if drawn out of the screen
         # https://github.com/pygame/pygame/issues/3778
-        pygame.gfxdraw.circle(self.window, *self.global_frame_to_draw_frame(point).to_pygame(), radius, color)
+        x, y = self.global_frame_to_draw_frame(point).to_pygame()
+        pygame.gfxdraw.circle(self.window, x, y, radius, color)
+        return self.add_dirty_rect(pygame.Rect(x - radius, y - radius, 2 * radius + 1, 2 * radius + 1))
 
 
     def draw_tangent_arc(self, point: V, normal: V, radius: float, color: tuple, draw_angle_deg: float = 140):
@@ -110,8 +315,12 @@ class EnhancedDrawScene(BaseScene):
         # Uses gfxdraw instead of draw to avoid the bug where a point becomes a line if drawn out of the screen
         # https://github.com/pygame/pygame/issues/3778
 
+        center = point + normal * radius
+        if not self.is_visible(center.x - abs(radius), center.y - abs(radius), center.x + abs(radius), center.y + abs(radius)):
+            return None
+
         draw_radius = abs(self.dist_global_to_draw(radius))
-        draw_point = self.global_frame_to_draw_frame(point + normal * radius)
+        draw_point = self.global_frame_to_draw_frame(center)
         draw_angle = math.radians(draw_angle_deg)
 
         center_angle = math.atan2(-normal.y, -normal.x)
@@ -120,30 +329,72 @@ class EnhancedDrawScene(BaseScene):
         start_angle = center_angle - draw_angle / 2
         end_angle = center_angle + draw_angle / 2
 
-        pygame.draw.arc(self.window, color, (
+        return self.add_dirty_rect(pygame.draw.arc(self.window, color, (
             draw_point.x - draw_radius,
             draw_point.y - draw_radius,
             draw_radius * 2,
             draw_radius * 2
-        ), start_angle, end_angle)
+        ), start_angle, end_angle))
         
 
     def draw_ellipse(self, center: V, minor_axis, major_axis, angle, color: tuple):
-        u = self.options.unit_vector_size_in_px * self.zoom_level
-
-        surface = pygame.Surface((u * major_axis, u * minor_axis), pygame.SRCALPHA)
-        rect = surface.get_rect()
-        pygame.draw.ellipse(surface, color, rect, rect.width)
-        rotated_surface = pygame.transform.rotate(surface, math.degrees(angle))
-        
-        rotated_center = rotated_surface.get_rect().center
-        center_draw_frame = self.global_frame_to_draw_frame(center)
-        blit_pos = (
-            center_draw_frame.x - rotated_center[0],
-            center_draw_frame.y - rotated_center[1]
-        )
+        """
+        Draws a filled ellipse on the window, as a polygon
 
-        self.window.blit(rotated_surface, blit_pos)
+        Arguments:
+            center: Vector2 -> The ellipse's center in the global frame
+            minor_axis: float -> The length of the minor axis in the global frame
+            major_axis: float -> The length of the major axis in the global frame
+            angle: float -> The angle between the global x axis and the major axis (radians)
+            color: tuple -> color in rgb (or rgba)
+        """
+        half_extent = max(abs(minor_axis), abs(major_axis)) / 2
+        half_extent_px = self.dist_global_to_draw(half_extent)
+        if half_extent_px < 0.5:
+            # Smaller than a pixel
+            return None
+        if not self.is_visible(center.x - half_extent, center.y - half_extent, center.x + half_extent, center.y + half_extent, 2):
+            return None
+        if half_extent_px < 1:
+            # A single pixel, the polygon wouldn't look any different
+            x, y = self.global_frame_to_draw_frame(center).to_pygame()
+            return self.add_dirty_rect(self.window.fill(color[:3], (x, y, 1, 1)))
+
+        # Just enough segments for the polygon to stay within half a pixel of the ellipse, by multiples of 8
+        segments = math.pi / math.acos(1 - 0.5 / half_extent_px)
+        segments = min(max(8, 8 * math.ceil(segments / 8)), self.max_ellipse_segments)
+        unit_circle, points = self.get_unit_circle(segments)
+
+        # Unit circle scaled by the semi axes, rotated and moved to the global frame
+        c = math.cos(angle)
+        s = math.sin(angle)
+        a = major_axis / 2 * unit_circle[:, 0]
+        b = minor_axis / 2 * unit_circle[:, 1]
+        points[:, 0] = a * c - b * s + center.x
+        points[:, 1] = a * s + b * c + center.y
+        points_in_window_frame = self.global_frame_to_draw_frame_array(points, out=points).tolist()
+
+        if len(color) == 3 or color[3] == 255:
+            return self.add_dirty_rect(pygame.draw.polygon(self.window, color, points_in_window_frame))
+
+        # Translucent, drawn on an intermediate surface
+        x_min, y_min = np.floor(points.min(axis=0))
+        x_max, y_max = np.ceil(points.max(axis=0))
+        surface = pygame.Surface((x_max - x_min + 1, y_max - y_min + 1), pygame.SRCALPHA)
+        pygame.draw.polygon(surface, color, (points - (x_min, y_min)).tolist())
+        return self.add_dirty_rect(self.window.blit(surface, (x_min, y_min)))
+
+
+    def get_unit_circle(self, segments: int):
+        """
+        Returns the (segments, 2) points of the unit circle, and a buffer of the same shape to transform them into
+        """
+        unit_circle = self.unit_circles.get(segments)
+        if unit_circle is None:
+            t = np.linspace(0, 2 * math.pi, segments, endpoint=False)
+            unit_circle = (np.column_stack([np.cos(t), np.sin(t)]), np.empty((segments, 2)))
+            self.unit_circles[segments] = unit_circle
+        return unit_circle
 
 
     def draw_rotated_rectangle(self, reference_point: V, theta_rad: float, size: V, offset: V, color: tuple = WHITE, width: int = 3):
@@ -156,27 +407,26 @@ class EnhancedDrawScene(BaseScene):
             width: int -> The width of the rectangle in px
         """
 
-        # Initial vector in the rectangle's frame, rotated to the global frame, and moved the origin to match the global frame
-        a = V(
-            - offset.x,
-            (size.y - offset.y)
-        )
-        b = V(
-            (size.x - offset.x),
-            (size.y - offset.y) 
-        )
-        c = V(
-            (size.x - offset.x),
-            - offset.y
-        )
-        d = V(
-            - offset.x,
-            - offset.y
-        )
-
-        points_in_global_frame = [point.rotate_by_angle(theta_rad) + reference_point for point in [a, b, c, d]]
-        points_in_window_frame = [self.global_frame_to_draw_frame(point).to_pygame() for point in points_in_global_frame]
-        pygame.draw.lines(self.window, color, True, points_in_window_frame, int(width * self.zoom_level))
+        # Bounding circle of the rectangle around the reference point
+        extent = math.hypot(max(abs(offset.x), abs(size.x - offset.x)), max(abs(offset.y), abs(size.y - offset.y)))
+        if not self.is_visible(reference_point.x - extent, reference_point.y - extent, reference_point.x + extent, reference_point.y + extent, width * self.zoom_level):
+            return None
+
+        # Corners in the rectangle's frame, rotated to the global frame, and moved the origin to match the global frame
+        corners = np.array([
+            [-offset.x,             size.y - offset.y],
+            [size.x - offset.x,     size.y - offset.y],
+            [size.x - offset.x,     -offset.y],
+            [-offset.x,             -offset.y]
+        ])
+        c = math.cos(theta_rad)
+        s = math.sin(theta_rad)
+        points_in_global_frame = np.empty((4, 2))
+        points_in_global_frame[:, 0] = corners[:, 0] * c - corners[:, 1] * s + reference_point.x
+        points_in_global_frame[:, 1] = corners[:, 0] * s + corners[:, 1] * c + reference_point.y
+
+        points_in_window_frame = self.global_frame_to_draw_frame_array(points_in_global_frame).astype(int).tolist()
+        return self.add_dirty_rect(pygame.draw.lines(self.window, color, True, points_in_window_frame, int(width * self.zoom_level)))
 
     
     def draw_line(self, pointA: V, pointB: V, color: tuple, width: int):
@@ -189,7 +439,11 @@ class EnhancedDrawScene(BaseScene):
             color: tuple -> color in rgb
             width: int -> width of the line
         """
-        pygame.draw.line(self.window, color, self.global_frame_to_draw_frame(pointA).to_pygame(), self.global_frame_to_draw_frame(pointB).to_pygame(), int(width * self.zoom_level))
+        if not self.is_visible(min(pointA.x, pointB.x), min(pointA.y, pointB.y), max(pointA.x, pointB.x), max(pointA.y, pointB.y), width * self.zoom_level):
+            return None
+
+        (a, b) = self.global_frame_to_draw_frame_array([(pointA.x, pointA.y), (pointB.x, pointB.y)]).astype(int).tolist()
+        return self.add_dirty_rect(pygame.draw.line(self.window, color, a, b, int(width * self.zoom_level)))
 
 
     def draw_reference_frame(self, position: V, theta_rad: float, scale_factor: float=1, x_axis_color: tuple = RED, y_axis_color: tuple = GREEN):
@@ -27,9 +27,12 @@ class TrailerTestingScene(EnhancedDrawScene):
         return dt
 
 
-    def draw(self, fenetre):
+    def draw_static(self, fenetre):
         self.draw_reference_frame(V(0,0), 0)
 
+    def draw(self, fenetre):
+        pass
+
 
     def handleInputs(self, dt, events):
         # Pause user inputs
@@ -4,10 +4,20 @@ from pygame.locals import *
 # Models
 from models.BicycleModel import BicycleModel
 from scenes.TrailerTestingScene import TrailerTestingScene
+from filters.ExtendedKalmanFilter import ExtendedKalmanFilter
+from filters.UnscentedKalmanFilter import UnscentedKalmanFilter
+from filters.ParticleFilter import ParticleFilter
+from filters.FusionScheduler import FusionScheduler
+from filters.PositionCorrection import POSITION_NOISE
+
+from lib.HUD.Canvas import Canvas
+from lib.HUD.Label import Label
 
 from lib.Math.Vector import Vector2 as V
 import math
+import time
 import numpy as np
+from collections import deque
 
 class Scene(TrailerTestingScene):
     def load(self):
@@ -21,20 +31,187 @@ class Scene(TrailerTestingScene):
         tracteasy_length = 3.2004 # m
         tracteasy_wheelbase = 2.5 # m 
         tracteasy_hook_offset_abs = 0.4 # m
-        self.vehicule = BicycleModel(V(tracteasy_length, tracteasy_width), V(tracteasy_hook_offset_abs, tracteasy_width/2), tracteasy_wheelbase, start_pos, math.radians(start_angle_deg))
+        self.vehicule = BicycleModel(V(tracteasy_length, tracteasy_width), V(tracteasy_hook_offset_abs, tracteasy_width/2), tracteasy_wheelbase, start_pos, math.radians(start_angle_deg), getattr(self.options, "integrator", "euler"))
+
+        estimators = {
+            "ekf": ExtendedKalmanFilter,
+            "ukf": UnscentedKalmanFilter
+        }
+        estimator_name = getattr(self.options, "estimator", "ekf")
+        if estimator_name not in estimators:
+            raise Exception(f"estimator should be one of {list(estimators.keys())}")
+
+        self.estimator = estimators[estimator_name](
+            [start_pos.x, start_pos.y, np.radians(start_angle_deg)],
+            tracteasy_wheelbase,
+            joseph_form=getattr(self.options, "ekf_joseph_form", False)
+        )
+
+        # Sensors rates, predictions follow the odometry and corrections the (possibly late) position measurements
+        self.simulation_time = 0
+        self.odometry_period = 1 / getattr(self.options, "odometry_rate", 100)
+        self.measurement_period = 1 / getattr(self.options, "measurement_rate", 10)
+        self.measurement_delay = getattr(self.options, "measurement_delay", 0)
+        self.odometry_timer = 0
+        self.measurement_timer = 0
+        self.delayed_measurements = deque()
+        # A measurement is handed over up to one physics step after its delay, and is timestamped
+        # up to one measurement period before that step
+        if getattr(self.options, "physics_rate", None):
+            max_step = 1 / self.options.physics_rate
+        else:
+            max_step = 1 / (self.options.fps_target * self.options.physics_frame)
+        max_lateness = self.measurement_delay + max_step + self.measurement_period
+        # Every measurement also adds a tick at its own timestamp
+        history_length = math.ceil(max_lateness / self.odometry_period) + math.ceil(max_lateness / self.measurement_period) + 3
+        # The Kalman filters snapshots are tiny, they keep at least the default history
+        self.fusion = FusionScheduler(self.estimator, self.simulation_time, max(100, history_length))
+        self.fusions = [self.fusion]
+
+        # Particle filter, running alongside the main estimator on the same sensor readings
+        self.particle_filter = None
+        if getattr(self.options, "particle_filter", False):
+            self.particle_filter = ParticleFilter(
+                [start_pos.x, start_pos.y, np.radians(start_angle_deg)],
+                tracteasy_wheelbase,
+                num_particles=getattr(self.options, "num_particles", 10000)
+            )
+            # Just enough history for the late measurements (snapshots of the particle filter are big)
+            self.fusions.append(FusionScheduler(self.particle_filter, self.simulation_time, history_length))
+            # The kidnapping spreads the particles over a square sized so that about 25 of them
+            # fall within 3 standard deviations of the position measurement
+            self.kidnap_half_width = math.sqrt(self.particle_filter.num_particles * math.pi * (3 * POSITION_NOISE) ** 2 / (4 * 25))
+        self.num_drawn_particles = getattr(self.options, "num_drawn_particles", 200)
 
-        self.x = np.array([start_pos.x, start_pos.y, np.radians(start_angle_deg)])
-        self.Q = np.diag([0.10 / 3, np.pi / 60]) ** 2
-        self.Q_corr = np.diag([0.40 / 3, 0.40 / 3]) ** 2
-        self.P = np.zeros((len(self.x), len(self.x)))
+        # Estimates before the last physics step, interpolated like the vehicle when drawing
+        self.previous_estimate = self.estimator.state.copy()
+        self.previous_particle_estimate = self.particle_filter.state.copy() if self.particle_filter else None
+
+        # Telemetry overlay
+        self.telemetry = getattr(self.options, "telemetry", False)
+        self.physics_steps = 0
+        self.physics_time = 0
+        if self.telemetry:
+            self.load_telemetry()
 
         # DEBUG
         self.noisy_P = start_pos
 
+    def load_telemetry(self):
+        """
+        Panel in the top left corner with the estimation error and consistency, and the loop timings.
+        Each field is a label, only re-rendered when its text changes
+        """
+        self.telemetry_fields = ["position_error", "heading_error", "trace_P", "nis", "frame", "late_frames", "physics"]
+        self.telemetry_background_color = (30, 30, 30)
+        self.telemetry_font = pygame.font.Font('lib/HUD/fonts/Oswald.ttf', 14)
+
+        margin = 6
+        line_height = self.telemetry_font.get_linesize()
+        size = V(240, len(self.telemetry_fields) * line_height + 2 * margin)
+        self.telemetry_canvas = Canvas(self.window, self.telemetry_background_color, V(10, 10), size).load()
+
+        self.telemetry_labels = {}
+        self.telemetry_texts = {}
+        for i, field in enumerate(self.telemetry_fields):
+            label = Label(self.telemetry_canvas, self.telemetry_font, "", color=(230, 230, 230), position=V(margin, margin + i * line_height), size=V(size.x - 2 * margin, line_height))
+            label.word_wrapping = False
+            label.add_to_canvas(self.telemetry_canvas)
+            self.telemetry_labels[field] = label
+            self.telemetry_texts[field] = None
+
+        self.telemetry_period = 1 / getattr(self.options, "telemetry_refresh_rate", 10)
+        self.telemetry_timer = self.telemetry_period # Filled on the first frame
+
+    def update_telemetry(self, dt):
+        self.telemetry_timer += dt
+        if self.telemetry_timer < self.telemetry_period:
+            return
+        elapsed = self.telemetry_timer
+        self.telemetry_timer = 0
+
+        x = self.estimator.state
+        truth = self.vehicule.position
+        heading_error = (x[2] - self.vehicule.theta_rad + math.pi) % (2 * math.pi) - math.pi
+        texts = {
+            "position_error": f"Position error: {math.hypot(x[0] - truth.x, x[1] - truth.y):.3f} m",
+            "heading_error": f"Heading error: {math.degrees(heading_error):.2f} deg",
+            "trace_P": f"trace(P): {np.trace(self.estimator.covariance):.3e}",
+            "nis": f"NIS: {self.estimator.nis:.2f}",
+            "frame": "Frame: -",
+            "late_frames": "Late frames: -",
+            "physics": "Physics: -"
+        }
+
+        # Timings since the last refresh
+        if self.frame_pacer and self.frame_pacer.window.num_ticks > 0:
+            stats = self.frame_pacer.window_stats()
+            texts["frame"] = f"Frame: {stats['mean_period_ms']:.2f} ms, jitter {stats['jitter_ms']:.2f} ms"
+            texts["late_frames"] = f"Late frames: {stats['missed']} (max {stats['max_lateness_ms']:.1f} ms late)"
+        if self.physics_steps > 0:
+            texts["physics"] = f"Physics: {1000 * self.physics_time / self.physics_steps:.3f} ms/step, {self.physics_steps / elapsed:.0f} steps/s"
+            self.physics_steps = 0
+            self.physics_time = 0
+
+        # Only the labels whose text changed are rendered and drawn again
+        for field in self.telemetry_fields:
+            text = texts[field]
+            if text == self.telemetry_texts[field]:
+                continue
+            self.telemetry_texts[field] = text
+
+            label = self.telemetry_labels[field]
+            label.change_text(text)
+            self.telemetry_canvas.surface.fill(self.telemetry_background_color, (*label.position.to_pygame(), *label.size.to_pygame()))
+            label.draw()
+
+    def draw_telemetry(self):
+        self.add_dirty_rect(self.window.blit(self.telemetry_canvas.surface, self.telemetry_canvas.position.to_pygame()))
+
     def update(self, dt, events):
-        dt = super().update(dt, events)
+        super().update(dt, events)
+
+        if self.telemetry:
+            self.update_telemetry(dt)
+
+        # Kidnapped robot test, the particles are spread around the vehicle
+        if self.particle_filter and events.on_first_kidnap:
+            p = self.vehicule.position
+            w = self.kidnap_half_width
+            self.particle_filter.spreadUniformly(p.x - w, p.x + w, p.y - w, p.y + w)
+
+
+    def _physics_update(self, dt):
+        start = time.perf_counter()
+        super()._physics_update(dt)
+        self.physics_time += time.perf_counter() - start
+        self.physics_steps += 1
+
+    def interpolate_estimate(self, previous, current, alpha):
+        """
+        Estimate [x, y, theta] alpha of the way between the previous and the current physics steps (like BicycleModel.getInterpolatedPose)
+        """
+        if alpha >= 1:
+            return current
+        dtheta = (current[2] - previous[2] + math.pi) % (2 * math.pi) - math.pi
+        return np.array([
+            previous[0] + alpha * (current[0] - previous[0]),
+            previous[1] + alpha * (current[1] - previous[1]),
+            previous[2] + alpha * dtheta
+        ])
+
+    def physics_update(self, dt):
+        self.previous_estimate = self.estimator.state.copy()
+        if self.particle_filter:
+            self.previous_particle_estimate = self.particle_filter.state.copy()
+
+        if self.pause_simulation:
+            # Nothing moves, the drawing must not be interpolated from an older state
+            self.vehicule.storePreviousState()
+            return
 
         # Update the model
+        self.vehicule.storePreviousState()
         self.vehicule.receiveInputs(math.radians(self.steering_deg), self.velocity)
 
         # Compute the model's derivatives
@@ -43,93 +220,53 @@ class Scene(TrailerTestingScene):
         # Compute the model's next state
         self.vehicule.computeNextState(dt)
 
-        # Update the KF 
-        # Model
-        # input: velocity_x and steering_angle
-        # state: x, y, theta
-        # x_dot = velocity * cos(theta)
-        # y_dot = velocity * sin(theta)
-        # theta_dot = velocity * tan(steering_angle) / wheelbase
-
-        # donc
-        # x_k°1 = x_k + dt * (velocity + n_v) * cos(theta)
-        # y_k°1 = y_k + dt * (velocity + n_v) * sin(theta)
-        # theta_k°1 = theta_k + dt * velocity * tan(steering_angle + n_a) / wheelbase
-        # donc X_k+1 = f(X_k, U_k, 0)
-        # avec f((x, y, theta), (velocity, steering), (n_v, n_a)) = [
-        #   x + dt * (velocity + n_v) * cos(theta), 
-        #   y + dt * (velocity + n_v) * sin(theta), 
-        #   theta + dt * velocity * tan(steering_angle + n_a) / wheelbase]
-        # )
-
-        # F = derivate of f wrt to X 
-        # F = [
-        #   [1, 0, -dt * (velocity) * sin(theta)],
-        #   [0, 1, dt * (velocity) * cos(theta)],
-        #   [0, 0, 1]
-        # ]
-
-        # G = derivate of f wrt to N 
-        # G = [
-        #   [dt * cos(theta), 0],
-        #   [dt * sin(theta), 0],
-        #   [0, dt * velocity / (wheelbase * cos(steering_angle + n_a) ** 2)]
-        # ]
-
-        # Prédiction
-        velocity = self.vehicule.getNoisyVelocity()
-        steering_angle = self.vehicule.getNoisySteering()
-        F = np.array([
-            [1, 0, -dt * velocity * math.sin(self.x[2])],
-            [0, 1, dt * velocity * math.cos(self.x[2])],
-            [0, 0, 1]
-        ])
+        # Update the KF
+        self.simulation_time += dt
 
-        G = np.array([
-            [dt * math.cos(self.x[2]), 0],
-            [dt * math.sin(self.x[2]), 0],
-            [0, dt * velocity / (self.vehicule.wheelbase * math.cos(steering_angle) ** 2)]
-        ])
+        self.odometry_timer += dt
+        while self.odometry_timer >= self.odometry_period:
+            self.odometry_timer -= self.odometry_period
+            odometry = (self.simulation_time - self.odometry_timer, self.vehicule.getNoisyVelocity(), self.vehicule.getNoisySteering())
+            for fusion in self.fusions:
+                fusion.addOdometry(*odometry)
 
-        self.x = self.x + np.array([
-            dt * velocity * math.cos(self.x[2]),
-            dt * velocity * math.sin(self.x[2]),
-            dt * velocity * math.tan(steering_angle) / self.vehicule.wheelbase
-        ])
-
-        self.P = F @ self.P @ F.T + G @ self.Q @ G.T
-
-        # Mesures et corrections
-        pos_mesuree = self.vehicule.getNoisyPosition()
-        # h(x) = [x, y]
-        # H = derivate of h wrt to X 
-        H = np.array([
-            [1, 0, 0],
-            [0, 1, 0]
-        ])
+        self.measurement_timer += dt
+        while self.measurement_timer >= self.measurement_period:
+            self.measurement_timer -= self.measurement_period
+            pos_mesuree = self.vehicule.getNoisyPosition()
+            self.delayed_measurements.append((self.simulation_time - self.measurement_timer, pos_mesuree.to_np()))
 
-        innovation = (pos_mesuree - V(self.x[0], self.x[1])).to_np()
-        S = H @ self.P @ H.T + self.Q_corr
-        K = self.P @ H.T @ np.linalg.inv(S)
+            # DEBUG
+            self.noisy_P = pos_mesuree
 
-        self.x = self.x + K @ innovation
-        self.P = (np.eye(len(self.x)) - K @ H) @ self.P
-
-        # DEBUG
-        self.noisy_P = pos_mesuree
+        while self.delayed_measurements and self.delayed_measurements[0][0] + self.measurement_delay <= self.simulation_time:
+            measurement = self.delayed_measurements.popleft()
+            for fusion in self.fusions:
+                fusion.addMeasurement(*measurement)
 
         
     def draw(self, fenetre):
         super().draw(fenetre)
-        self.vehicule.draw(self, fenetre)
+        self.vehicule.draw(self, fenetre, self.physics_alpha)
 
         #self.draw_circle(self.vehicule.position, (255, 0, 0), 20)
-        self.draw_reference_frame(V(self.x[0:2]), self.x[2], 1, (255, 0, 0), (255, 0, 0))
+        x = self.interpolate_estimate(self.previous_estimate, self.estimator.state, self.physics_alpha)
+        self.draw_reference_frame(V(x[0:2]), x[2], 1, (255, 0, 0), (255, 0, 0))
         #self.draw_reference_frame(self.noisy_P, self.vehicule.theta_rad, 1, (0, 255, 0), (0, 255, 0))
 
         # Covariance 
-        P = self.P[0:2, 0:2]
+        P = self.estimator.covariance[0:2, 0:2]
         [a, b] = np.sort(np.linalg.eigvals(P)).tolist()
         semi_minor = 2 * a * np.sqrt(5.991)
         semi_major = 2 * b * np.sqrt(5.991)
-        self.draw_ellipse(V(self.x[0], self.x[1]), semi_minor, semi_major, self.x[2], (0, 0, 255))
+        self.draw_ellipse(V(x[0], x[1]), semi_minor, semi_major, x[2], (0, 0, 255))
+
+        # Particle filter
+        if self.particle_filter:
+            step = max(1, self.particle_filter.num_particles // self.num_drawn_particles)
+            self.draw_points(self.particle_filter.particles[::step, 0:2], (0, 160, 0), 1)
+            x = self.interpolate_estimate(self.previous_particle_estimate, self.particle_filter.state, self.physics_alpha)
+            self.draw_reference_frame(V(x[0:2]), x[2], 1, (0, 160, 0), (0, 160, 0))
+
+        if self.telemetry:
+            self.draw_telemetry()
@@ -0,0 +1,141 @@
+import os
+import sys
+
+if __name__ == "__main__" and not __package__:
+    # Run as a script (python utils/HeadlessRunner.py), the packages are at the root of the repository
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.Math.Vector import Vector2 as V
+
+from models.BicycleModel import BicycleModel
+from filters.ExtendedKalmanFilter import ExtendedKalmanFilter
+
+import time
+import numpy as np
+
+class HeadlessRunner:
+    def __init__(self, vehicule: BicycleModel, Q=None, Q_corr=None, joseph_form=False, recorder=None, seed=None) -> None:
+        """Drives a BicycleModel and its EKF from a scripted input stream, as fast as the CPU allows.
+        Nothing in here imports pygame, so it can be used for batch replays and tuning.
+
+        Args:
+            vehicule (BicycleModel): The simulated vehicle (ground truth)
+            Q (np.ndarray, optional): Covariance of the (velocity, steering) noise. Defaults to the scene's value.
+            Q_corr (np.ndarray, optional): Covariance of the position measurement noise. Defaults to the scene's value.
+            joseph_form (bool, optional): Use the Joseph form covariance correction. Defaults to False.
+            recorder (EKFRecorder, optional): Records the filter's steps, for smoothing with RTSSmoother
+            seed (int, optional): Seed of np.random, for reproducible runs
+        """
+        self.vehicule = vehicule
+
+        self.ekf = ExtendedKalmanFilter(
+            [vehicule.position.x, vehicule.position.y, vehicule.theta_rad],
+            vehicule.wheelbase,
+            Q=Q,
+            Q_corr=Q_corr,
+            joseph_form=joseph_form
+        )
+
+        self.recorder = recorder
+        if recorder is not None:
+            recorder.recordPosterior(self.ekf)
+
+        if seed is not None:
+            np.random.seed(seed)
+
+        self.elapsed_time = 0
+
+
+    def step(self, dt, steering_rad, velocity):
+        """Advances the model and the filter by one step of length dt
+
+        Args:
+            dt (float): The step size (s)
+            steering_rad (float): The steering input (rad)
+            velocity (float): The velocity input (m/s)
+        """
+        # Update the model
+        self.vehicule.receiveInputs(steering_rad, velocity)
+        self.vehicule.computeStateDerivatives(dt)
+        self.vehicule.computeNextState(dt)
+
+        # Update the filter
+        self.ekf.predict(dt, self.vehicule.getNoisyVelocity(), self.vehicule.getNoisySteering())
+        if self.recorder is not None:
+            self.recorder.recordPrediction(self.ekf)
+
+        self.ekf.update(self.vehicule.getNoisyPosition().to_np())
+        if self.recorder is not None:
+            self.recorder.recordPosterior(self.ekf)
+
+        self.elapsed_time += dt
+
+
+    def run(self, inputs):
+        """Replays a whole input stream
+
+        Args:
+            inputs (array like): (N, 3) rows of [dt, steering_rad, velocity]
+
+        Returns:
+            dict: The recorded run, with keys
+                time: (N,) simulated time after each step
+                truth: (N, 3) the model's [x, y, theta]
+                estimate: (N, 3) the filter's [x, y, theta]
+                covariance: (N, 3, 3) the filter's covariance
+                wall_time: the real time the replay took (s)
+        """
+        inputs = np.asarray(inputs, dtype=float).reshape(-1, 3)
+        num_steps = len(inputs)
+
+        record = {
+            "time": np.empty(num_steps),
+            "truth": np.empty((num_steps, 3)),
+            "estimate": np.empty((num_steps, 3)),
+            "covariance": np.empty((num_steps, 3, 3)),
+        }
+
+        start = time.perf_counter()
+        for i, (dt, steering_rad, velocity) in enumerate(inputs.tolist()):
+            self.step(dt, steering_rad, velocity)
+
+            record["time"][i] = self.elapsed_time
+            record["truth"][i] = (self.vehicule.position.x, self.vehicule.position.y, self.vehicule.theta_rad)
+            record["estimate"][i] = self.ekf.state
+            record["covariance"][i] = self.ekf.covariance
+        record["wall_time"] = time.perf_counter() - start
+
+        return record
+
+
+    def runFromFile(self, path, delimiter=","):
+        """Replays an input stream stored as a text file, one "dt, steering_rad, velocity" row per line
+
+        Args:
+            path (str): The path to the input file
+            delimiter (str, optional): The column delimiter. Defaults to ",".
+        """
+        return self.run(np.loadtxt(path, delimiter=delimiter, ndmin=2))
+
+
+if __name__ == "__main__":
+    # python utils/HeadlessRunner.py [inputs file] (or python -m utils.HeadlessRunner from the repository root)
+    tracteasy_width = 1.8288 # m
+    tracteasy_length = 3.2004 # m
+    tracteasy_wheelbase = 2.5 # m
+    tracteasy_hook_offset_abs = 0.4 # m
+    vehicule = BicycleModel(V(tracteasy_length, tracteasy_width), V(tracteasy_hook_offset_abs, tracteasy_width/2), tracteasy_wheelbase, V(2, 1), 0)
+
+    runner = HeadlessRunner(vehicule, seed=0)
+    if len(sys.argv) > 1:
+        record = runner.runFromFile(sys.argv[1])
+    else:
+        # 10 minutes at 120 Hz, slowly weaving
+        dt = 1 / 120
+        t = np.arange(0, 600, dt)
+        inputs = np.column_stack([np.full_like(t, dt), np.radians(20) * np.sin(t / 5), np.full_like(t, 5)])
+        record = runner.run(inputs)
+
+    error = np.linalg.norm(record["truth"][:, 0:2] - record["estimate"][:, 0:2], axis=1)
+    print(f"{len(record['time'])} steps ({record['time'][-1]:.1f} s simulated) in {record['wall_time']:.2f} s")
+    print(f"Mean position error: {error.mean():.3f} m, max: {error.max():.3f} m")
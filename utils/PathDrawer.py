@@ -1,20 +1,47 @@
 from lib.Math.Vector import Vector2 as V
 
-from collections import deque
+import numpy as np
 
 class PathDrawer:
     def __init__(self, max_num_points, color, radius):
-        self.points = deque([], max_num_points) # points in global frame
+        # Ring buffer of the points in global frame, the oldest ones are overwritten once it is full
+        self.buffer = np.empty((max_num_points, 2))
+        self.head = 0 # Index of the next point to write
+        self.length = 0
         self.num_points = max_num_points
         self.color = color
         self.radius = radius
 
+    def __len__(self):
+        return self.length
+
     def addPoint(self, point):
-        self.points.append(V(point))
-        # self.points.append(V(point))
-        # if len(self.points) > self.num_points:
-        #     self.points.pop(0)
+        if isinstance(point, V):
+            point = (point.x, point.y)
+        self.buffer[self.head] = point
+        self.head = (self.head + 1) % self.num_points
+        if self.length < self.num_points:
+            self.length += 1
+
+    def clear(self):
+        self.head = 0
+        self.length = 0
+
+    @property
+    def view(self):
+        """
+        Zero copy view on the stored points, not in chronological order once the buffer wrapped around
+        """
+        return self.buffer[:self.length]
+
+    def getPoints(self):
+        """
+        Returns a (N, 2) copy of the points, from the oldest to the newest
+        """
+        if self.length < self.num_points:
+            return self.buffer[:self.length].copy()
+        return np.concatenate([self.buffer[self.head:], self.buffer[:self.head]])
 
     def draw(self, scene):
-        for point in self.points: # (self, point: V, color: tuple, radius=5, width=0):
-            scene.draw_point(point, self.color, self.radius)
+        # All the points are transformed and blitted in one batch (the drawing order doesn't matter)
+        scene.draw_points(self.view, self.color, self.radius)